@@ -14,4 +14,9 @@ urlpatterns = [
         views.indicadores_especialidades,
         name="indicadores_especialidades"
     ),
+    path(
+        "indicadores-especialidades/graficos/<slug:grafico>",
+        views.grafico_indicadores,
+        name="grafico_indicadores"
+    ),
 ]
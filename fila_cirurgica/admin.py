@@ -5,7 +5,6 @@ from simple_history.admin import SimpleHistoryAdmin
 from unfold.admin import ModelAdmin
 from unfold.contrib.filters.admin import AutocompleteSelectMultipleFilter
 from django.contrib.admin import SimpleListFilter
-from django.db.models import Count
 from django.template.response import TemplateResponse
 from django.urls import path
 from django.http import JsonResponse
@@ -17,26 +16,19 @@ from .models import (
     ProfissionalAghu,
     IndicadorEspecialidade,
 )
-from .api_helpers import (
-    get_or_create_paciente,
-    get_or_create_procedimento,
-    get_or_create_especialidade,
-    get_or_create_profissional
-)
+from .api_helpers import resolver_entidades
 from django.conf import settings
 from django.utils.html import format_html
 from .forms import ListaEsperaCirurgicaForm
-from django.utils.timezone import now
-from datetime import timedelta
-from django.db.models.functions import TruncMonth
-from django.db.models import Count, Min
+from .cache import indicadores_em_cache
+from .indicadores import periodo_meses
 from django import forms
 from django.shortcuts import redirect, render
 from django import forms
 from django.urls import path, reverse
 from django.http import HttpResponseRedirect
 from django.views.generic import FormView
-from unfold.views import UnfoldModelAdminViewMixin
+from unfold.views import ChangeList, UnfoldModelAdminViewMixin
 import requests
 from simple_history.utils import update_change_reason
 from django.urls import reverse
@@ -67,79 +59,8 @@ class IndicadorEspecialidadeAdmin(admin.ModelAdmin):
     change_list_template = 'admin/indicadores_especialidade.html'
 
     def changelist_view(self, request, extra_context=None):
-        # últimos 3 meses
-        hoje = now().date()
-        inicio_periodo = hoje.replace(day=1) - timedelta(days=60)
-        # Obtém contagem por especialidade
-        qs = (
-            ListaEsperaCirurgica.objects
-                .values('especialidade__nome_especialidade')
-                .annotate(total=Count('id'))
-        )
-        # Agrupamento por mês
-        qs_mensal = (
-            ListaEsperaCirurgica.objects
-            .filter(data_entrada__date__gte=inicio_periodo)
-            .annotate(mes=TruncMonth('data_entrada'))
-            .values('mes')
-            .annotate(total=Count('id'))
-            .order_by('mes')
-        )
-        total_geral = ListaEsperaCirurgica.objects.count() or 1
-        # prepara dados para gráfico
-        labels = [item['especialidade__nome_especialidade'] for item in qs]
-        data = [item['total'] for item in qs]
-        percentages = [round(item['total'] / total_geral * 100, 2) for item in qs]
-        labels_bar = [item['mes'].strftime('%b/%Y') for item in qs_mensal]
-        data_bar = [item['total'] for item in qs_mensal]
-
-        context = {
-            'labels': labels,
-            'data': data,
-            'percentages': percentages,
-            'labels_bar': labels_bar,
-            'data_bar': data_bar,
-        }
-        
-        # Top 10 procedimentos com mais pacientes --------------
-        qs_proc_count = (
-            ListaEsperaCirurgica.objects
-            .values('procedimento__nome')
-            .annotate(total=Count('id'))
-            .order_by('-total')[:10]
-        )
-        labels_proc_count = [i['procedimento__nome'] for i in qs_proc_count]
-        data_proc_count   = [i['total'] for i in qs_proc_count]
-
-        #  Top 10 procedimentos com maior tempo de espera -------
-        qs_proc_wait = (
-            ListaEsperaCirurgica.objects
-            .values('procedimento__nome')
-            .annotate(first_dt=Min('data_entrada'))
-        )
-        # converte em lista de tuplas (nome, dias_espera) e ordena
-        today = now()
-        wait_list = [
-            (i['procedimento__nome'], (today - i['first_dt']).days)
-            for i in qs_proc_wait if i['first_dt'] is not None
-        ]
-        wait_list.sort(key=lambda x: x[1], reverse=True)
-        wait_list = wait_list[:10]                         # top-10
-        labels_proc_wait = [w[0] for w in wait_list]
-        data_proc_wait   = [w[1] for w in wait_list]
-
-        context = {
-            'labels': labels,
-            'data': data,
-            'percentages': percentages,
-            'labels_bar': labels_bar,
-            'data_bar': data_bar,
-            # novos conjuntos
-            'labels_proc_count': labels_proc_count,
-            'data_proc_count': data_proc_count,
-            'labels_proc_wait': labels_proc_wait,
-            'data_proc_wait': data_proc_wait,
-        }
+        # KPIs e gráficos (ver fila_cirurgica.indicadores)
+        context = indicadores_em_cache(periodo_meses(request.GET.get("meses")))
         return TemplateResponse(
             request,
             self.change_list_template,
@@ -246,6 +167,14 @@ class AtivoNaFilaFilter(SimpleListFilter):
             return queryset.filter(ativo=False)
         return queryset 
 
+class FilaChangeList(ChangeList):
+    """Resolve as posições da página inteira em uma consulta (janela SQL)."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        ListaEsperaCirurgica.objects.anotar_posicoes(self.result_list)
+
+
 @admin.register(ListaEsperaCirurgica)
 class ListaEsperaCirurgicaAdmin(SimpleHistoryAdmin, ModelAdmin):
     form = ListaEsperaCirurgicaForm
@@ -274,6 +203,9 @@ class ListaEsperaCirurgicaAdmin(SimpleHistoryAdmin, ModelAdmin):
     def get_queryset(self, request):
         return ListaEsperaCirurgica.objects.ordered()
 
+    def get_changelist(self, request, **kwargs):
+        return FilaChangeList
+
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -292,26 +224,19 @@ class ListaEsperaCirurgicaAdmin(SimpleHistoryAdmin, ModelAdmin):
         return form
     
 
-    def delete_model(self, request, obj):
-        # Ignora o delete para nenhuma entrada ser deletada
-        pass
-
-
     def save_model(self, request, obj, form, change):
         """Processa campos de autocomplete com dados da API externa."""
         try:    
-            # if not obj:
-            # Paciente
-            obj.paciente = get_or_create_paciente(form.cleaned_data.get('paciente_api_choice'))
-
-            # Procedimento
-            obj.procedimento = get_or_create_procedimento(form.cleaned_data.get('procedimento_api_choice'))
-
-            # Especialidade
-            obj.especialidade = get_or_create_especialidade(form.cleaned_data.get('especialidade_api_choice'))
-
-            # Médico (opcional)
-            obj.medico = get_or_create_profissional(form.cleaned_data.get('medico_api_choice'))
+            # Paciente, procedimento, especialidade e médico (opcional),
+            # buscados na API em paralelo
+            objetos = resolver_entidades(
+                paciente=('paciente', form.cleaned_data.get('paciente_api_choice')),
+                procedimento=('procedimento', form.cleaned_data.get('procedimento_api_choice')),
+                especialidade=('especialidade', form.cleaned_data.get('especialidade_api_choice')),
+                medico=('profissional', form.cleaned_data.get('medico_api_choice')),
+            )
+            for campo, valor in objetos.items():
+                setattr(obj, campo, valor)
 
         except requests.RequestException as e:
             self.message_user(
@@ -410,10 +335,12 @@ class ListaEsperaCirurgicaAdmin(SimpleHistoryAdmin, ModelAdmin):
 
     @admin.display(description="Posição na Fila")
     def get_posicao(self, obj):
-        # Implemente a lógica para obter a posição na fila aqui
-        # Exemplo simples:
-        # return ListaEsperaCirurgica.objects.filter(data_entrada__lt=obj.data_entrada).count() + 1
-        return format_html('<div style="text-align:center;min-width:3ch;">{}</div>', obj.get_posicao()) # Se você já tem esse método no modelo
+        # Na changelist a posição já vem resolvida em lote (FilaChangeList)
+        if hasattr(obj, 'posicao_fila'):
+            posicao = obj.posicao_fila if obj.ativo else "\\"
+        else:
+            posicao = obj.get_posicao()
+        return format_html('<div style="text-align:center;min-width:3ch;">{}</div>', posicao)
 
     @admin.display(description="Especialidade")
     def especialidade(self, obj):
@@ -429,9 +356,9 @@ class ListaEsperaCirurgicaAdmin(SimpleHistoryAdmin, ModelAdmin):
         return super().has_change_permission(request, obj)
     
     def has_delete_permission(self, request, obj=None):
-        if obj and not obj.ativo:   # exemplo
-            return False            # abre read-only
-        return super().has_delete_permission(request, obj)
+        # Nenhuma entrada é deletada pelo admin: a saída da fila é pela ação
+        # "remover da fila", que mantém o histórico
+        return False
         
     @admin.display(description="Ações", ordering=False)
     def acoes(self, obj):
@@ -505,6 +432,7 @@ class ProcedimentoAdmin(ModelAdmin):
 class EspecialidadeAdmin(ModelAdmin):
     list_display = ('cod_especialidade', 'nome_especialidade')
     search_fields = ['nome_especialidade', 'cod_especialidade']
+    autocomplete_fields = ['procedimentos']
 
 
 @admin.register(ProfissionalAghu)
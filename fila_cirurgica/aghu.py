@@ -0,0 +1,299 @@
+# fila_cirurgica/aghu.py
+"""
+Cliente HTTP único para a API do AGHU (settings.API_BASE_URL).
+
+Todas as chamadas passam por uma `requests.Session` do processo, com pool
+de conexões keep-alive, timeout por endpoint e novas tentativas limitadas
+(com backoff) para falhas de conexão e 502/503/504. Cada endpoint acumula
+contadores de chamadas, erros e latência, lidos com `metricas()`.
+
+As buscas do autocomplete passam por `get_json_em_cache`, que guarda as
+respostas no cache "aghu" (LRU em memória, ver settings.CACHES) com TTL
+por endpoint. Vencido o TTL, a resposta antiga ainda é servida enquanto
+uma nova é buscada em segundo plano.
+
+Um disjuntor protege os workers quando o AGHU fica lento ou fora do ar:
+depois de `FALHAS_PARA_ABRIR` falhas seguidas, as chamadas falham na hora
+(`AghuIndisponivel`) por `ESPERA_DISJUNTOR` segundos; então uma chamada de
+teste decide se ele fecha de novo.
+
+Erros continuam saindo como `requests.RequestException`, que é o que as
+views e os forms já tratam.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (conexão, leitura) em segundos. O autocomplete é interativo: melhor falhar
+# rápido do que prender o worker; as buscas por código são mais leves.
+TIMEOUT_PADRAO = (3.05, 10)
+TIMEOUTS = {
+    "pacientes": (3.05, 5),
+    "profissionais": (3.05, 5),
+    "especialidades": (3.05, 5),
+    "procedimentos": (3.05, 8),
+}
+
+# Validade (s) das respostas em cache. Especialidades e profissionais quase
+# não mudam; pacientes novos precisam aparecer logo.
+CACHE_TTL_PADRAO = 60 * 10
+CACHE_TTLS = {
+    "especialidades": 60 * 60 * 24,
+    "profissionais": 60 * 60 * 6,
+    "procedimentos": 60 * 60 * 12,
+    "pacientes": 60 * 5,
+}
+
+# Por quanto tempo (s), além do TTL, uma resposta vencida ainda pode ser
+# servida enquanto a nova é buscada
+CACHE_VELHO = 60 * 60 * 24
+
+# Disjuntor: falhas seguidas que o abrem e segundos até a chamada de teste
+FALHAS_PARA_ABRIR = 5
+ESPERA_DISJUNTOR = 30
+
+# Só GET é repetido, em falhas de conexão e 502/503/504. Timeouts de
+# leitura não: repetir triplicaria o tempo que o worker fica preso.
+TENTATIVAS = 2
+BACKOFF = 0.3
+
+# Chamadas acima deste tempo (s) são registradas no log
+LIMITE_LENTO = 2.0
+
+
+def _nova_sessao():
+    tentativas = Retry(
+        total=TENTATIVAS,
+        read=0,
+        backoff_factor=BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    tamanho = getattr(settings, "AGHU_POOL_CONEXOES", 10)
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho, max_retries=tentativas)
+    sessao = requests.Session()
+    sessao.headers.update({"Accept": "application/json"})
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+_sessao = _nova_sessao()
+
+# Threads para chamadas em paralelo e atualizações em segundo plano
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "AGHU_POOL_CONEXOES", 10),
+    thread_name_prefix="aghu",
+)
+
+
+class AghuIndisponivel(requests.ConnectionError):
+    """Chamada recusada sem sair do servidor: o disjuntor está aberto."""
+
+
+def falha_de_disponibilidade(erro):
+    """
+    True para erros que indicam o AGHU fora do ar ou sobrecarregado
+    (conexão, timeout, 5xx, disjuntor aberto); um 404 ou 400 não conta.
+    """
+    if isinstance(erro, requests.HTTPError):
+        return erro.response is not None and erro.response.status_code >= 500
+    return isinstance(erro, (requests.ConnectionError, requests.Timeout))
+
+
+class Disjuntor:
+    def __init__(self, falhas_para_abrir, espera):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.espera = espera
+        self._falhas = 0
+        self._aberto_ate = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._aberto_ate is None:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+
+    def permitir(self):
+        """
+        Se a chamada pode sair. Com o disjuntor aberto, não; vencida a
+        espera, só uma chamada de teste por vez.
+        """
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_ate = None
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._testando or self._falhas >= self.falhas_para_abrir:
+                if self._aberto_ate is None:
+                    logger.warning("AGHU indisponível: disjuntor aberto por %ss", self.espera)
+                self._aberto_ate = time.monotonic() + self.espera
+            self._testando = False
+
+
+disjuntor = Disjuntor(FALHAS_PARA_ABRIR, ESPERA_DISJUNTOR)
+
+_metricas = defaultdict(
+    lambda: {
+        "chamadas": 0, "erros": 0, "tempo_total": 0.0, "tempo_max": 0.0, "acertos_cache": 0, "recusadas": 0,
+    }
+)
+_metricas_lock = threading.Lock()
+
+
+def _registrar(endpoint, duracao, erro):
+    with _metricas_lock:
+        m = _metricas[endpoint]
+        m["chamadas"] += 1
+        m["erros"] += int(erro)
+        m["tempo_total"] += duracao
+        m["tempo_max"] = max(m["tempo_max"], duracao)
+
+
+def _incrementar(endpoint, contador):
+    with _metricas_lock:
+        _metricas[endpoint][contador] += 1
+
+
+def metricas():
+    """
+    Cópia dos contadores por endpoint: chamadas à API, erros, latência
+    média e máxima (ms), respostas servidas do cache e chamadas recusadas
+    pelo disjuntor, desde o início do processo. A chave "disjuntor" traz o
+    estado atual dele.
+    """
+    with _metricas_lock:
+        dados = {
+            endpoint: {
+                "chamadas": m["chamadas"],
+                "erros": m["erros"],
+                "acertos_cache": m["acertos_cache"],
+                "recusadas": m["recusadas"],
+                "latencia_media_ms": round(1000 * m["tempo_total"] / m["chamadas"], 1) if m["chamadas"] else 0.0,
+                "latencia_max_ms": round(1000 * m["tempo_max"], 1),
+            }
+            for endpoint, m in _metricas.items()
+        }
+    dados["disjuntor"] = disjuntor.estado
+    return dados
+
+
+def _endpoint(caminho):
+    return caminho.strip("/").split("/", 1)[0]
+
+
+def get_json(caminho, params=None, timeout=None):
+    """
+    GET em `{API_BASE_URL}/{caminho}` e devolve o JSON decodificado.
+    O endpoint (primeiro segmento do caminho) define o timeout e agrupa as
+    métricas. Levanta `requests.RequestException` em falha ou status >= 400,
+    e `AghuIndisponivel`, sem chamar a API, com o disjuntor aberto.
+    """
+    endpoint = _endpoint(caminho)
+    if not disjuntor.permitir():
+        _incrementar(endpoint, "recusadas")
+        raise AghuIndisponivel("API do AGHU indisponível no momento; tente novamente em instantes.")
+    if timeout is None:
+        timeout = TIMEOUTS.get(endpoint, TIMEOUT_PADRAO)
+    inicio = time.perf_counter()
+    erro = True
+    try:
+        resposta = _sessao.get(f"{settings.API_BASE_URL}/{caminho}", params=params, timeout=timeout)
+        resposta.raise_for_status()
+        dados = resposta.json()
+    except ValueError as e:
+        # JSON inválido conta como falha da API (vem antes: o erro de JSON do
+        # requests também é um RequestException)
+        disjuntor.falha()
+        raise requests.RequestException(f"Resposta inválida da API AGHU: {e}") from e
+    except requests.RequestException as e:
+        if falha_de_disponibilidade(e):
+            disjuntor.falha()
+        else:
+            # 4xx: o AGHU respondeu, está de pé
+            disjuntor.sucesso()
+        raise
+    except Exception:
+        # Qualquer outro erro também encerra uma chamada de teste do disjuntor
+        disjuntor.falha()
+        raise
+    else:
+        erro = False
+        disjuntor.sucesso()
+        return dados
+    finally:
+        duracao = time.perf_counter() - inicio
+        _registrar(endpoint, duracao, erro)
+        if duracao > LIMITE_LENTO:
+            logger.warning("AGHU %s levou %.2fs (erro=%s)", caminho, duracao, erro)
+
+
+def get_json_em_cache(caminho, params=None, timeout=None):
+    """
+    `get_json` com a resposta guardada no cache "aghu" por
+    `CACHE_TTLS[endpoint]`. A chave é o caminho mais os parâmetros
+    (term, page, limit, filtro de especialidade...), então a mesma busca
+    ou o mesmo pré-carregamento por id não sai do servidor de novo.
+
+    Vencido o TTL, a resposta guardada continua sendo devolvida (por até
+    `CACHE_VELHO`) e uma única atualização sai em segundo plano; com o
+    AGHU fora do ar, a busca segue funcionando com o que já foi visto.
+    Falhas não são guardadas.
+    """
+    endpoint = _endpoint(caminho)
+    consulta = urlencode(sorted((params or {}).items()))
+    # Termos digitados podem ter espaços e acentos: a chave vai em hash
+    resumo = hashlib.md5(f"{caminho.strip('/')}?{consulta}".encode()).hexdigest()
+    chave = f"fila_cirurgica:aghu:{endpoint}:{resumo}"
+
+    cache = caches["aghu"]
+    guardado = cache.get(chave)
+    if guardado is not None:
+        _incrementar(endpoint, "acertos_cache")
+        dados, valido_ate = guardado
+        # cache.add só grava se a chave não existir: uma atualização por vez
+        if time.time() >= valido_ate and cache.add(f"{chave}:atualizando", True, ESPERA_DISJUNTOR):
+            executor.submit(_atualizar_cache, chave, caminho, params, timeout)
+        return dados
+    return _atualizar_cache(chave, caminho, params, timeout)
+
+
+def _atualizar_cache(chave, caminho, params, timeout):
+    cache = caches["aghu"]
+    try:
+        dados = get_json(caminho, params=params, timeout=timeout)
+    except requests.RequestException:
+        cache.delete(f"{chave}:atualizando")
+        raise
+    ttl = CACHE_TTLS.get(_endpoint(caminho), CACHE_TTL_PADRAO)
+    cache.set(chave, (dados, time.time() + ttl), ttl + CACHE_VELHO)
+    cache.delete(f"{chave}:atualizando")
+    return dados
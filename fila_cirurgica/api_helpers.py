@@ -1,123 +1,326 @@
 # fila_cirurgica/api_helpers.py
 
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
 import requests
-from django.conf import settings
+from django.db import connections, transaction
+
+from . import aghu
+from .catalogos import procedimento_na_especialidade
 from .models import (
+    CatalogoAghu,
     PacienteAghu,
     ProcedimentoAghu,
     EspecialidadeAghu,
     ProfissionalAghu,
+    normalizar_busca,
 )
 
-def get_or_create_paciente(prontuario):
-    if not prontuario:
-        return None
+logger = logging.getLogger(__name__)
+
 
-    response = requests.get(f"{settings.API_BASE_URL}/pacientes/{prontuario}")
-    response.raise_for_status()
-    data = response.json()
+class Entidade(NamedTuple):
+    endpoint: str
+    modelo: type
+    campo_codigo: str
+    campo_nome: str
+    chave_codigo: str
+    chave_nome: str
 
-    obj, created = PacienteAghu.objects.get_or_create(
-        prontuario=data['PRONTUARIO_PAC'],
-        defaults={'nome': data['NOME_PACIENTE']}
+
+ENTIDADES = {
+    'paciente': Entidade('pacientes', PacienteAghu, 'prontuario', 'nome', 'PRONTUARIO_PAC', 'NOME_PACIENTE'),
+    'procedimento': Entidade('procedimentos', ProcedimentoAghu, 'codigo', 'nome', 'COD_PROCEDIMENTO', 'PROCEDIMENTO'),
+    'especialidade': Entidade(
+        'especialidades', EspecialidadeAghu, 'cod_especialidade', 'nome_especialidade',
+        'COD_ESPECIALIDADE', 'NOME_ESPECIALIDADE',
+    ),
+    'profissional': Entidade('profissionais', ProfissionalAghu, 'matricula', 'nome', 'MATRICULA', 'NOME_PROFISSIONAL'),
+}
+
+def _buscar(tipo, codigo):
+    return aghu.get_json(f"{ENTIDADES[tipo].endpoint}/{codigo}")
+
+
+def _gravar(tipo, data):
+    """Cria o registro local a partir do JSON da API, ou atualiza o nome."""
+    entidade = ENTIDADES[tipo]
+    nome = data[entidade.chave_nome]
+    obj, created = entidade.modelo.objects.get_or_create(
+        **{entidade.campo_codigo: data[entidade.chave_codigo]},
+        defaults={entidade.campo_nome: nome},
     )
-    if not created and obj.nome != data['NOME_PACIENTE']:
-        obj.nome = data['NOME_PACIENTE']
+    if not created and getattr(obj, entidade.campo_nome) != nome:
+        setattr(obj, entidade.campo_nome, nome)
         obj.save()
     return obj
 
+
+_em_atualizacao = set()
+_em_atualizacao_lock = threading.Lock()
+
+
+def _copia_local(tipo, codigo, erro):
+    """
+    Registro local já conhecido, para quando o AGHU não responde (ou o
+    disjuntor está aberto); ele é atualizado em segundo plano assim que a
+    API voltar. Sem cópia local, ou se o erro não for de
+    disponibilidade (ex.: 404), relança `erro`.
+    """
+    if not aghu.falha_de_disponibilidade(erro):
+        raise erro
+    entidade = ENTIDADES[tipo]
+    obj = entidade.modelo.objects.filter(**{entidade.campo_codigo: codigo}).first()
+    if obj is None:
+        raise erro
+    logger.warning("AGHU indisponível: usando a cópia local de %s %s", tipo, codigo)
+    _agendar_atualizacao(tipo, codigo)
+    return obj
+
+
+def _agendar_atualizacao(tipo, codigo):
+    with _em_atualizacao_lock:
+        if (tipo, codigo) in _em_atualizacao:
+            return
+        _em_atualizacao.add((tipo, codigo))
+    # Tenta depois da espera do disjuntor, quando a chamada de teste é liberada
+    temporizador = threading.Timer(aghu.ESPERA_DISJUNTOR, _atualizar, (tipo, codigo))
+    temporizador.daemon = True
+    temporizador.start()
+
+
+def _atualizar(tipo, codigo):
+    try:
+        _gravar(tipo, _buscar(tipo, codigo))
+    except requests.RequestException:
+        pass
+    finally:
+        with _em_atualizacao_lock:
+            _em_atualizacao.discard((tipo, codigo))
+        # Conexões com o banco são por thread: fecha a desta
+        connections.close_all()
+
+
+def _obter(tipo, codigo):
+    try:
+        data = _buscar(tipo, codigo)
+    except requests.RequestException as e:
+        return _copia_local(tipo, str(codigo), e)
+    return _gravar(tipo, data)
+
+
+def get_or_create_paciente(prontuario):
+    if not prontuario:
+        return None
+    return _obter('paciente', prontuario)
+
+
 def get_or_create_procedimento(codigo):
     if not codigo:
         return None
+    return _obter('procedimento', codigo)
 
-    response = requests.get(f"{settings.API_BASE_URL}/procedimentos/{codigo}")
-    response.raise_for_status()
-    data = response.json()
-
-    obj, created = ProcedimentoAghu.objects.get_or_create(
-        codigo=data['COD_PROCEDIMENTO'],
-        defaults={'nome': data['PROCEDIMENTO']}
-    )
-    if not created and obj.nome != data['PROCEDIMENTO']:
-        obj.nome = data['PROCEDIMENTO']
-        obj.save()
-    return obj
 
 def get_or_create_especialidade(cod_especialidade):
     if not cod_especialidade:
         return None
+    return _obter('especialidade', cod_especialidade)
 
-    response = requests.get(f"{settings.API_BASE_URL}/especialidades/{cod_especialidade}")
-    response.raise_for_status()
-    data = response.json()
-
-    obj, created = EspecialidadeAghu.objects.get_or_create(
-        cod_especialidade=data['COD_ESPECIALIDADE'],
-        defaults={'nome_especialidade': data['NOME_ESPECIALIDADE']}
-    )
-    if not created and obj.nome_especialidade != data['NOME_ESPECIALIDADE']:
-        obj.nome_especialidade = data['NOME_ESPECIALIDADE']
-        obj.save()
-    return obj
 
 def get_or_create_profissional(matricula):
     if not matricula:
         return None
+    return _obter('profissional', matricula)
+
+
+def resolver_entidades(**pedidos):
+    """
+    Versão concorrente dos `get_or_create_*` para quem precisa de várias
+    entidades de uma vez (salvamento dos formulários da fila e da AIH):
+
+        resolver_entidades(
+            paciente=('paciente', prontuario),
+            especialidade=('especialidade', esp_id),
+            medico=('profissional', med_id),
+        )
+
+    As buscas na API (uma por código distinto) saem em paralelo, então o
+    tempo total é o da chamada mais lenta, não a soma; depois os registros
+    locais são gravados em uma única transação. Retorna {nome: objeto}, com
+    None para códigos vazios. Com o AGHU indisponível, usa a cópia local de
+    quem já a tiver; as demais falhas saem como `requests.RequestException`.
+    """
+    chaves = {(tipo, str(codigo)) for tipo, codigo in pedidos.values() if codigo}
+    futuros = {chave: aghu.executor.submit(_buscar, *chave) for chave in chaves}
+    dados, copias = {}, {}
+    for chave, futuro in futuros.items():
+        try:
+            dados[chave] = futuro.result()
+        except requests.RequestException as e:
+            copias[chave] = _copia_local(*chave, e)
+
+    with transaction.atomic():
+        objetos = {chave: _gravar(chave[0], data) for chave, data in dados.items()}
+    objetos.update(copias)
+    return {
+        nome: objetos[(tipo, str(codigo))] if codigo else None
+        for nome, (tipo, codigo) in pedidos.items()
+    }
+
+
+# Chamadas simultâneas de um lote. Fica abaixo do pool de conexões e usa
+# threads próprias, para um lote grande não atrasar os formulários.
+PARALELISMO_LOTE = 8
+
+
+def _buscar_sem_erro(tipo, codigo):
+    try:
+        return _buscar(tipo, codigo), None
+    except requests.RequestException as e:
+        return None, e
+
+
+def resolver_em_lote(tipo, codigos, paralelismo=PARALELISMO_LOTE):
+    """
+    Versão em lote dos `get_or_create_*` (importações, lotes de AIH, carga
+    da LEC): recebe muitos códigos de um `tipo` de ENTIDADES e devolve
+    {codigo: objeto}.
+
+    Os códigos são deduplicados, buscados na API com até `paralelismo`
+    chamadas simultâneas e gravados com um único upsert
+    (`bulk_create(update_conflicts=True)`), mais uma consulta para ler os
+    objetos. Com o AGHU indisponível, vale a cópia local de quem já a
+    tiver, atualizada em segundo plano quando a API voltar. Códigos que a
+    API não encontrar (ou sem resposta e sem cópia local) ficam de fora do
+    resultado e são registrados no log.
+    """
+    entidade = ENTIDADES[tipo]
+    unicos = list(dict.fromkeys(str(c).strip() for c in codigos if c and str(c).strip()))
+    if not unicos:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=paralelismo, thread_name_prefix='aghu-lote') as executor:
+        respostas = list(executor.map(lambda codigo: _buscar_sem_erro(tipo, codigo), unicos))
+
+    # {código pedido: código gravado}; a API pode devolver o código em outro
+    # formato (ex.: sem zeros à esquerda), mas o resultado é pelo pedido
+    novos, aceitos, copias_locais, falhas = {}, {}, [], []
+    for codigo, (data, erro) in zip(unicos, respostas):
+        if erro is None:
+            codigo_api = str(data[entidade.chave_codigo])
+            novos[codigo_api] = data[entidade.chave_nome]
+            aceitos[codigo] = codigo_api
+        elif aghu.falha_de_disponibilidade(erro):
+            aceitos[codigo] = codigo  # vale a cópia local, se houver
+            copias_locais.append(codigo)
+        else:
+            falhas.append(codigo)
+
+    campos = [entidade.campo_nome]
+    catalogo = issubclass(entidade.modelo, CatalogoAghu)
+    if catalogo:
+        campos.append('nome_busca')
+    objetos = []
+    for codigo, nome in novos.items():
+        obj = entidade.modelo(**{entidade.campo_codigo: codigo, entidade.campo_nome: nome})
+        if catalogo:
+            # bulk_create não passa pelo save(), que calcula o nome de busca
+            obj.nome_busca = normalizar_busca(nome)
+        objetos.append(obj)
+
+    with transaction.atomic():
+        entidade.modelo.objects.bulk_create(
+            objetos,
+            update_conflicts=True,
+            unique_fields=[entidade.campo_codigo],
+            update_fields=campos,
+            batch_size=1000,
+        )
+    gravados = entidade.modelo.objects.in_bulk(set(aceitos.values()), field_name=entidade.campo_codigo)
+    resolvidos = {
+        codigo: gravados[codigo_gravado]
+        for codigo, codigo_gravado in aceitos.items()
+        if codigo_gravado in gravados
+    }
+
+    usadas = [codigo for codigo in copias_locais if codigo in resolvidos]
+    if usadas:
+        logger.warning("AGHU indisponível: usando a cópia local de %d %s(s)", len(usadas), tipo)
+    for codigo in usadas:
+        _agendar_atualizacao(tipo, codigo)
+
+    perdidos = falhas + [c for c in aceitos if c not in resolvidos]
+    if perdidos:
+        logger.warning("AGHU: %d %s(s) não resolvido(s): %s", len(perdidos), tipo, ", ".join(perdidos[:20]))
+    return resolvidos
+
+
+def get_or_create_pacientes(prontuarios):
+    return resolver_em_lote('paciente', prontuarios)
+
+
+def get_or_create_procedimentos(codigos):
+    return resolver_em_lote('procedimento', codigos)
+
+
+def get_or_create_especialidades(cods_especialidade):
+    return resolver_em_lote('especialidade', cods_especialidade)
+
+
+def get_or_create_profissionais(matriculas):
+    return resolver_em_lote('profissional', matriculas)
 
-    response = requests.get(f"{settings.API_BASE_URL}/profissionais/{matricula}")
-    response.raise_for_status()
-    data = response.json()
 
-    obj, created = ProfissionalAghu.objects.get_or_create(
-        matricula=data['MATRICULA'],
-        defaults={'nome': data['NOME_PROFISSIONAL']}
-    )
-    if not created and obj.nome != data['NOME_PROFISSIONAL']:
-        obj.nome = data['NOME_PROFISSIONAL']
-        obj.save()
-    return obj
 # Adicionar no final de fila_cirurgica/api_helpers.py
 
 def validar_procedimento_na_especialidade(procedimento_id: str, especialidade_id: str) -> bool:
     """
-    Verifica via API se um procedimento específico pertence a uma especialidade.
+    Verifica se um procedimento específico pertence a uma especialidade.
 
     Esta função é usada para validação no backend (forms.py) para garantir
     que a combinação enviada pelo usuário é válida.
 
+    Usa a relação local `EspecialidadeAghu.procedimentos` (uma consulta
+    indexada); só consulta a API se a especialidade ainda não tiver
+    procedimentos carregados.
+
     Retorna True se a combinação for válida, False caso contrário.
     """
     if not procedimento_id or not especialidade_id:
         return False
 
+    local = procedimento_na_especialidade(str(procedimento_id), str(especialidade_id))
+    if local is not None:
+        return local
+
     # A URL e os parâmetros são baseados na lógica encontrada em `utils.api_autocomplete_procedimento`
-    api_url = f"{settings.API_BASE_URL}/procedimentos/"
     params = {
         'cod_especialidade': especialidade_id,
         'term': procedimento_id,  # Usamos 'term' para buscar o código específico
-        'limit': 1                # Só precisamos de 1 resultado para confirmar a existência
+        'limit': 25,
     }
 
     try:
-        # Assumindo que a validação não precisa de autenticação especial,
-        # caso contrário, adicione os headers necessários.
-        response = requests.get(api_url, params=params, timeout=5)
-        response.raise_for_status()  # Lança erro para status 4xx/5xx
-        data = response.json()
+        data = aghu.get_json("procedimentos/", params=params, timeout=(3.05, 5))
 
         # Normaliza a resposta (pode ser lista ou dict com 'results')
         if isinstance(data, dict) and 'results' in data:
             items = data['results']
         else:
             items = data
-        
-        # Se a API retornou algum item que corresponde à busca, a combinação é válida.
-        # Para uma validação mais estrita, poderíamos verificar se o ID do item retornado
-        # é exatamente igual ao `procedimento_id`, mas `len(items) > 0` é suficiente aqui.
-        return len(items) > 0
+
+        # A busca por 'term' também casa trechos de outros códigos e nomes:
+        # só vale o item com o código exato.
+        return any(str(item.get('COD_PROCEDIMENTO')) == str(procedimento_id) for item in items)
 
     except requests.RequestException as e:
         # Em caso de falha na API, é mais seguro invalidar a submissão
         # para forçar uma nova tentativa do usuário.
-        print(f"ERRO DE VALIDAÇÃO: Falha ao contatar a API para validar procedimento. {e}")
-        return False
\ No newline at end of file
+        logger.warning(
+            "Falha ao contatar a API para validar o procedimento %s na especialidade %s: %s",
+            procedimento_id, especialidade_id, e,
+        )
+        return False
@@ -5,3 +5,6 @@ class FilaCirurgicaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fila_cirurgica'
     verbose_name = 'Fila Cirúrgica'
+
+    def ready(self):
+        from . import signals  # noqa: F401
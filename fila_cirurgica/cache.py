@@ -0,0 +1,180 @@
+# fila_cirurgica/cache.py
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils.dateformat import format as formatar_data
+from django.utils.timezone import localtime
+
+from .indicadores import indicadores_fila
+from .models import ConsultaPublica, ListaEsperaCirurgica, PrevisaoCirurgia, SnapshotFila, VersaoFila
+
+# Versões antigas não são apagadas; expiram sozinhas.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+# Mesmo sem alterações na fila, os dias de espera mudam com o tempo.
+INDICADORES_TIMEOUT = 60 * 60
+# Prontuários remontados por lote em `atualizar_consultas_publicas`
+LOTE_CONSULTAS = 100
+
+
+def snapshot_posicoes():
+    """
+    Retorna {id: (posicao_fila, posicao_especialidade, posicao_procedimento)}
+    de toda a fila ativa, em cache sob a versão atual da fila.
+
+    Enquanto nenhuma entrada for salva, as consultas reaproveitam o mesmo
+    dicionário em vez de recalcular as posições no banco.
+    """
+    chave = f"fila_cirurgica:posicoes:{VersaoFila.atual()}"
+    snapshot = cache.get(chave)
+    if snapshot is None:
+        fila = (
+            ListaEsperaCirurgica.objects.filter(ativo=True)
+            .with_posicao("especialidade", "procedimento")
+            .values_list("id", "posicao_fila", "posicao_especialidade", "posicao_procedimento")
+        )
+        snapshot = {row[0]: row[1:] for row in fila}
+        cache.set(chave, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def indicadores_em_cache(meses):
+    """
+    `indicadores_fila(meses)` em cache sob a versão atual da fila: uma
+    sequência de acessos ao dashboard ou à página pública reaproveita os
+    mesmos agregados até a próxima alteração.
+    """
+    chave = f"fila_cirurgica:indicadores:{meses}:{VersaoFila.atual()}"
+    dados = cache.get(chave)
+    if dados is None:
+        dados = indicadores_fila(meses)
+        cache.set(chave, dados, INDICADORES_TIMEOUT)
+    return dados
+
+
+def consulta_publica(prontuario):
+    """
+    Resposta da consulta pública do prontuário:
+    {"entradas_ativas": [...], "entradas_inativas": [...]}, ou None se ele
+    não tiver entradas.
+
+    Lê a linha de `ConsultaPublica`; só a primeira consulta de um
+    prontuário monta e grava a linha. Linhas marcadas como pendentes por
+    uma alteração da fila continuam sendo servidas até o comando
+    `atualizar_consultas_publicas` remontá-las.
+    """
+    pronta = (
+        ConsultaPublica.objects.filter(prontuario=prontuario)
+        .values("entradas_ativas", "entradas_inativas")
+        .first()
+    )
+    if pronta is None:
+        return atualizar_consulta_publica(prontuario)
+    return pronta
+
+
+def atualizar_consulta_publica(prontuario):
+    """Monta e grava a resposta do prontuário na versão atual da fila."""
+    versao = VersaoFila.atual()
+    entradas = list(_entradas_dos_prontuarios([prontuario]))
+    if not entradas:
+        ConsultaPublica.objects.filter(prontuario=prontuario).delete()
+        return None
+
+    dados = _resumir_entradas(entradas, *_dados_das_entradas(entradas))
+    ConsultaPublica.objects.update_or_create(
+        prontuario=prontuario, defaults={"versao": versao, "pendente": False, **dados}
+    )
+    return dados
+
+
+def atualizar_consultas_publicas():
+    """
+    Remonta as linhas de `ConsultaPublica` marcadas como pendentes, em
+    lotes de `LOTE_CONSULTAS` prontuários. Retorna quantas linhas foram
+    remontadas.
+
+    Cada lote é desmarcado antes de ser montado: uma gravação que chegue
+    durante a montagem marca a linha de novo e ela entra na próxima execução.
+    """
+    pendentes = list(
+        ConsultaPublica.objects.filter(pendente=True).order_by("pk").values_list("pk", "prontuario")
+    )
+    remontadas = 0
+    for inicio in range(0, len(pendentes), LOTE_CONSULTAS):
+        lote = dict(pendentes[inicio:inicio + LOTE_CONSULTAS])
+        ConsultaPublica.objects.filter(pk__in=lote).update(pendente=False)
+        versao = VersaoFila.atual()
+        por_prontuario = defaultdict(list)
+        entradas = list(_entradas_dos_prontuarios(lote.values()))
+        for entrada in entradas:
+            por_prontuario[entrada.paciente.prontuario].append(entrada)
+        tendencias, previsoes = _dados_das_entradas(entradas)
+
+        linhas, sem_entradas = [], []
+        for pk, prontuario in lote.items():
+            if prontuario not in por_prontuario:
+                sem_entradas.append(pk)
+                continue
+            dados = _resumir_entradas(por_prontuario[prontuario], tendencias, previsoes)
+            linhas.append(ConsultaPublica(pk=pk, prontuario=prontuario, versao=versao, **dados))
+        ConsultaPublica.objects.filter(pk__in=sem_entradas).delete()
+        ConsultaPublica.objects.bulk_update(linhas, ["versao", "entradas_ativas", "entradas_inativas"])
+        remontadas += len(linhas)
+    return remontadas
+
+
+def _entradas_dos_prontuarios(prontuarios):
+    return ListaEsperaCirurgica.objects.select_related("especialidade", "procedimento", "paciente").filter(
+        paciente__prontuario__in=list(prontuarios)
+    )
+
+
+def _dados_das_entradas(entradas):
+    """Evolução diária e datas previstas das entradas ativas, em uma consulta cada."""
+    ids_ativos = [e.id for e in entradas if e.ativo]
+    tendencias = SnapshotFila.tendencia(ids_ativos)
+    # Datas estimadas já calculadas em lote (prever_datas_cirurgia)
+    previsoes = dict(
+        PrevisaoCirurgia.objects.filter(entrada_id__in=ids_ativos)
+        .values_list("entrada_id", "data_prevista")
+    )
+    return tendencias, previsoes
+
+
+def _resumir_entradas(entradas, tendencias, previsoes):
+    # Posições vêm do snapshot em cache (recalculado só quando a fila muda)
+    pos_map = snapshot_posicoes()
+
+    ativas, inativas = [], []
+    for entrada in entradas:
+        posicao, posicao_especialidade, posicao_procedimento = (
+            pos_map.get(entrada.id, (None, None, None)) if entrada.ativo else (None, None, None)
+        )
+        item = {
+            "id": entrada.id,
+            "prontuario": entrada.paciente.prontuario,
+            "especialidade": getattr(entrada.especialidade, "nome_especialidade", ""),
+            "procedimento": getattr(entrada.procedimento, "nome", ""),
+            "posicao": posicao,
+            "posicao_especialidade": posicao_especialidade,
+            "posicao_procedimento": posicao_procedimento,
+            "ativo": entrada.ativo,
+            "data_entrada": formatar_data(localtime(entrada.data_entrada), "d/m/Y H:i"),
+        }
+        if entrada.ativo:
+            variacao = SnapshotFila.variacao(tendencias.get(entrada.id, []), posicao)
+            data_prevista = previsoes.get(entrada.id)
+            item["variacao"] = variacao
+            item["variacao_abs"] = abs(variacao or 0)
+            item["data_prevista"] = formatar_data(data_prevista, "m/Y") if data_prevista else None
+            ativas.append((posicao or 10**9, item))
+        else:
+            inativas.append((entrada.data_entrada, item))
+
+    # Ordene: ativas por posição asc; inativas por data_entrada desc
+    ativas.sort(key=lambda x: x[0])
+    inativas.sort(key=lambda x: x[0], reverse=True)
+    return {
+        "entradas_ativas": [item for _, item in ativas],
+        "entradas_inativas": [item for _, item in inativas],
+    }
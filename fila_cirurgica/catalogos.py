@@ -0,0 +1,286 @@
+# fila_cirurgica/catalogos.py
+"""
+Espelho local dos catálogos do AGHU (especialidades, procedimentos e
+profissionais) e o autocomplete servido a partir dele.
+
+`sincronizar_catalogo` traz do AGHU só o que mudou desde a maior
+`atualizado_em` já gravada e faz upsert em lote; `buscar` responde ao
+autocomplete com uma consulta local, sem sair do servidor de aplicação.
+
+A relação especialidade→procedimento (`EspecialidadeAghu.procedimentos`)
+vem do CSV exportado do AGHU ou da própria API e atende a validação dos
+formulários e o autocomplete de procedimentos filtrado por especialidade.
+"""
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Value, When
+from django.utils.dateparse import parse_datetime
+
+from . import aghu
+from .models import EspecialidadeAghu, ProcedimentoAghu, ProfissionalAghu, normalizar_busca
+
+# Registros pedidos ao AGHU por página durante a sincronização
+TAMANHO_PAGINA = 500
+# Validade (s) da resposta de `sincronizado`
+SINCRONIZADO_TIMEOUT = 60 * 5
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    modelo: type
+    endpoint: str
+    campo_codigo: str
+    campo_nome: str
+    # Chaves correspondentes no JSON do AGHU
+    chave_codigo: str
+    chave_nome: str
+    # Texto exibido no Select2, igual ao do proxy da API
+    formato: str
+
+
+CATALOGOS = {
+    "especialidades": Catalogo(
+        EspecialidadeAghu, "especialidades", "cod_especialidade", "nome_especialidade",
+        "COD_ESPECIALIDADE", "NOME_ESPECIALIDADE", "{nome}",
+    ),
+    "procedimentos": Catalogo(
+        ProcedimentoAghu, "procedimentos", "codigo", "nome",
+        "COD_PROCEDIMENTO", "PROCEDIMENTO", "{codigo} - {nome}",
+    ),
+    "profissionais": Catalogo(
+        ProfissionalAghu, "profissionais", "matricula", "nome",
+        "MATRICULA", "NOME_PROFISSIONAL", "{nome} (Matrícula: {codigo})",
+    ),
+}
+
+# Data da última alteração de cada registro no AGHU, e o parâmetro que
+# filtra a listagem por ela
+CHAVE_ALTERACAO = "UPDATED_AT"
+PARAMETRO_DESDE = "updated_since"
+
+
+def _itens(dados):
+    if isinstance(dados, dict) and "results" in dados:
+        return dados["results"]
+    return dados
+
+
+def sincronizar_catalogo(nome, completo=False):
+    """
+    Copia para a tabela local os registros do catálogo `nome` alterados no
+    AGHU desde a última sincronização (ou todos, se `completo`). Retorna o
+    número de registros gravados.
+    """
+    catalogo = CATALOGOS[nome]
+    modelo = catalogo.modelo
+    desde = None if completo else modelo.objects.aggregate(m=Max("atualizado_em"))["m"]
+
+    gravados = 0
+    pagina = 1
+    while True:
+        params = {"page": pagina, "limit": TAMANHO_PAGINA}
+        if desde is not None:
+            # Inclusivo: registros na mesma marca são regravados, sem perda
+            params[PARAMETRO_DESDE] = desde.isoformat()
+        itens = _itens(aghu.get_json(f"{catalogo.endpoint}/", params=params))
+
+        objetos = {}
+        for registro in itens:
+            codigo = str(registro[catalogo.chave_codigo])
+            nome_item = registro[catalogo.chave_nome] or ""
+            alteracao = registro.get(CHAVE_ALTERACAO)
+            objetos[codigo] = modelo(**{
+                catalogo.campo_codigo: codigo,
+                catalogo.campo_nome: nome_item,
+                "nome_busca": normalizar_busca(nome_item),
+                "atualizado_em": parse_datetime(alteracao) if alteracao else None,
+            })
+        if objetos:
+            modelo.objects.bulk_create(
+                objetos.values(),
+                update_conflicts=True,
+                unique_fields=[catalogo.campo_codigo],
+                update_fields=[catalogo.campo_nome, "nome_busca", "atualizado_em"],
+            )
+            gravados += len(objetos)
+        if len(itens) < TAMANHO_PAGINA:
+            if gravados:
+                cache.delete(_chave_sincronizado(nome))
+            return gravados
+        pagina += 1
+
+
+def especialidades_procedimentos_do_aghu():
+    """
+    Pares (especialidade, procedimento) de todas as especialidades locais,
+    lidos da API (procedimentos filtrados por `cod_especialidade`), no
+    formato aceito por `carregar_especialidades_procedimentos`.
+    """
+    procedimentos = CATALOGOS["procedimentos"]
+    for cod_especialidade, nome_especialidade in EspecialidadeAghu.objects.values_list(
+        "cod_especialidade", "nome_especialidade"
+    ):
+        pagina = 1
+        while True:
+            params = {"cod_especialidade": cod_especialidade, "page": pagina, "limit": TAMANHO_PAGINA}
+            itens = _itens(aghu.get_json(f"{procedimentos.endpoint}/", params=params))
+            for registro in itens:
+                yield (
+                    cod_especialidade,
+                    nome_especialidade,
+                    str(registro[procedimentos.chave_codigo]),
+                    registro[procedimentos.chave_nome] or "",
+                )
+            if len(itens) < TAMANHO_PAGINA:
+                break
+            pagina += 1
+
+
+@transaction.atomic
+def carregar_especialidades_procedimentos(pares):
+    """
+    Substitui os procedimentos das especialidades presentes em `pares`
+    (cod_especialidade, nome_especialidade, cod_procedimento,
+    nome_procedimento); as demais especialidades mantêm a relação que já
+    tinham. Especialidades e procedimentos que faltarem são criados, e os
+    nomes atualizados, com um upsert em lote por tabela. Retorna o número
+    de pares gravados.
+
+    Levanta `ValueError` sem `pares`, para que um arquivo vazio ou com o
+    cabeçalho errado não apague a relação. Passe uma lista: um gerador que
+    chame a API prenderia a transação durante as requisições.
+    """
+    especialidades, procedimentos, relacao = {}, {}, set()
+    for cod_esp, nome_esp, cod_proc, nome_proc in pares:
+        especialidades[cod_esp] = nome_esp
+        procedimentos[cod_proc] = nome_proc
+        relacao.add((cod_esp, cod_proc))
+    if not relacao:
+        raise ValueError("Nenhum par especialidade/procedimento válido para carregar.")
+
+    EspecialidadeAghu.objects.bulk_create(
+        [
+            EspecialidadeAghu(cod_especialidade=c, nome_especialidade=n, nome_busca=normalizar_busca(n))
+            for c, n in especialidades.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["cod_especialidade"],
+        update_fields=["nome_especialidade", "nome_busca"],
+        batch_size=1000,
+    )
+    ProcedimentoAghu.objects.bulk_create(
+        [ProcedimentoAghu(codigo=c, nome=n, nome_busca=normalizar_busca(n)) for c, n in procedimentos.items()],
+        update_conflicts=True,
+        unique_fields=["codigo"],
+        update_fields=["nome", "nome_busca"],
+        batch_size=1000,
+    )
+
+    ids_esp = dict(
+        EspecialidadeAghu.objects.filter(cod_especialidade__in=especialidades)
+        .values_list("cod_especialidade", "id")
+    )
+    ids_proc = dict(ProcedimentoAghu.objects.filter(codigo__in=procedimentos).values_list("codigo", "id"))
+    Relacao = EspecialidadeAghu.procedimentos.through
+    Relacao.objects.filter(especialidadeaghu_id__in=ids_esp.values()).delete()
+    Relacao.objects.bulk_create(
+        [
+            Relacao(especialidadeaghu_id=ids_esp[cod_esp], procedimentoaghu_id=ids_proc[cod_proc])
+            for cod_esp, cod_proc in relacao
+        ],
+        batch_size=5000,
+    )
+    return len(relacao)
+
+
+def sincronizado(nome):
+    """
+    Se o catálogo `nome` já foi sincronizado alguma vez: algum registro
+    traz a data de alteração no AGHU. Os que são só gravados pelos
+    formulários não trazem. A resposta fica em cache por
+    `SINCRONIZADO_TIMEOUT`, então uma tabela esvaziada ou recarregada
+    volta a ser consultada sem reiniciar o processo.
+    """
+    chave = _chave_sincronizado(nome)
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = CATALOGOS[nome].modelo.objects.filter(atualizado_em__isnull=False).exists()
+        cache.set(chave, resultado, SINCRONIZADO_TIMEOUT)
+    return resultado
+
+
+def _chave_sincronizado(nome):
+    return f"fila_cirurgica:catalogo_sincronizado:{nome}"
+
+
+def _relacao_da_especialidade(cod_especialidade):
+    Relacao = EspecialidadeAghu.procedimentos.through
+    return Relacao.objects.filter(especialidadeaghu__cod_especialidade=cod_especialidade)
+
+
+def especialidade_com_procedimentos(cod_especialidade):
+    """Se a especialidade já tem a relação de procedimentos carregada."""
+    return _relacao_da_especialidade(cod_especialidade).exists()
+
+
+def procedimento_na_especialidade(cod_procedimento, cod_especialidade):
+    """
+    True/False pela relação local, ou None se a especialidade ainda não
+    tem procedimentos carregados (quem chama decide se consulta a API).
+    """
+    da_especialidade = _relacao_da_especialidade(cod_especialidade)
+    if da_especialidade.filter(procedimentoaghu__codigo=cod_procedimento).exists():
+        return True
+    return False if da_especialidade.exists() else None
+
+
+def _resultado(catalogo, codigo, nome_item):
+    return {"id": codigo, "text": catalogo.formato.format(codigo=codigo, nome=nome_item)}
+
+
+def item(nome, codigo):
+    """Resultado do autocomplete para um código (pré-carregamento do Select2), ou None."""
+    catalogo = CATALOGOS[nome]
+    linha = (
+        catalogo.modelo.objects.filter(**{catalogo.campo_codigo: codigo})
+        .values_list(catalogo.campo_codigo, catalogo.campo_nome)
+        .first()
+    )
+    return _resultado(catalogo, *linha) if linha else None
+
+
+def buscar(nome, termo="", pagina=1, limite=25, filtros=None):
+    """
+    Autocomplete local do catálogo `nome`: {"results", "pagination"} no
+    mesmo formato do proxy da API. O termo casa com qualquer trecho do nome
+    (sem acento, sem distinção de maiúsculas) ou com o início do código;
+    quem começa pelo termo vem primeiro. `filtros` restringe o catálogo
+    (ex.: procedimentos de uma especialidade).
+    """
+    catalogo = CATALOGOS[nome]
+    campo_codigo, campo_nome = catalogo.campo_codigo, catalogo.campo_nome
+    termo_busca = normalizar_busca(termo)
+
+    qs = catalogo.modelo.objects.filter(**(filtros or {}))
+    if termo_busca:
+        qs = qs.filter(
+            Q(nome_busca__contains=termo_busca) | Q(**{f"{campo_codigo}__startswith": termo.strip()})
+        ).annotate(
+            comeca=Case(
+                When(nome_busca__startswith=termo_busca, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by("comeca", "nome_busca", campo_codigo)
+    else:
+        qs = qs.order_by("nome_busca", campo_codigo)
+
+    inicio = (pagina - 1) * limite
+    # Um registro a mais diz se há próxima página, sem COUNT
+    linhas = list(qs.values_list(campo_codigo, campo_nome)[inicio:inicio + limite + 1])
+    return {
+        "results": [_resultado(catalogo, codigo, nome_item) for codigo, nome_item in linhas[:limite]],
+        "pagination": {"more": len(linhas) > limite},
+    }
@@ -0,0 +1,138 @@
+# fila_cirurgica/eventos.py
+"""
+Barramento de eventos em memória para os dashboards abertos (SSE, ver
+`portal.views.eventos_dashboard`).
+
+Cada conexão assina uma fila asyncio no seu event loop; a publicação vem
+de código síncrono (em outra thread) e é entregue com
+`call_soon_threadsafe`.
+
+Uma gravação acontece em um só dos workers, e as conexões estão
+espalhadas entre todos. Por isso, enquanto houver conexões, uma thread de
+cada processo lê `VersaoFila` a cada `SSE_INTERVALO` segundos e publica os
+KPIs quando ela muda, venha a alteração de qualquer worker. Cada conexão
+calcula a variação contra o que ela mesma já enviou. É o ponto a trocar por um
+broker (Redis pub/sub, LISTEN/NOTIFY) se o atraso não bastar.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .indicadores import kpis_fila
+from .models import VersaoFila
+
+logger = logging.getLogger(__name__)
+
+# Eventos guardados por conexão; se o cliente atrasar, os mais antigos são
+# descartados (cada evento traz os valores completos, não só a variação).
+TAMANHO_FILA = 10
+
+# Segundos entre as leituras de `VersaoFila`
+INTERVALO = getattr(settings, "SSE_INTERVALO", 2)
+
+
+class BarramentoEventos:
+    def __init__(self, max_assinantes):
+        self.max_assinantes = max_assinantes
+        self._assinantes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def tem_assinantes(self):
+        return bool(self._assinantes)
+
+    def assinar(self):
+        """Fila de eventos da conexão atual, ou None se o limite foi atingido."""
+        fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+        with self._lock:
+            if len(self._assinantes) >= self.max_assinantes:
+                return None
+            self._assinantes.add((asyncio.get_running_loop(), fila))
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes = {(loop, f) for loop, f in self._assinantes if f is not fila}
+
+    def lotado(self):
+        return len(self._assinantes) >= self.max_assinantes
+
+    def publicar(self, evento):
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for loop, fila in assinantes:
+            loop.call_soon_threadsafe(self._entregar, fila, evento)
+
+    @staticmethod
+    def _entregar(fila, evento):
+        if fila.full():
+            fila.get_nowait()
+        fila.put_nowait(evento)
+
+
+barramento = BarramentoEventos(max_assinantes=getattr(settings, "SSE_MAX_CONEXOES", 50))
+
+
+def publicar_kpis():
+    """
+    Lê os KPIs (O(1), de `ContadorFila`) e publica {"kpis"} a todas as
+    conexões. Chamado quando `VersaoFila` muda; cada conexão compara com o
+    que já enviou e só repassa o que mudou. Sem conexões abertas, não
+    consulta nada.
+    """
+    if not barramento.tem_assinantes:
+        return
+    barramento.publicar({"kpis": kpis_fila()})
+
+
+def variacao_kpis(anteriores, atuais):
+    """{chave: diferença} dos KPIs que mudaram entre `anteriores` e `atuais`."""
+    return {
+        chave: valor - anteriores.get(chave, valor)
+        for chave, valor in atuais.items()
+        if valor != anteriores.get(chave, valor)
+    }
+
+
+_vigia_lock = threading.Lock()
+_vigia_ativa = False
+
+
+def vigiar_versao():
+    """Garante a thread que acompanha `VersaoFila` (uma por processo)."""
+    global _vigia_ativa
+    with _vigia_lock:
+        if _vigia_ativa:
+            return
+        _vigia_ativa = True
+    threading.Thread(target=_vigiar, name="sse-versao-fila", daemon=True).start()
+
+
+def _vigiar():
+    global _vigia_ativa
+    versao = None
+    try:
+        while True:
+            with _vigia_lock:
+                # Última conexão saiu: a próxima assinatura cria outra thread
+                if not barramento.tem_assinantes:
+                    _vigia_ativa = False
+                    return
+            try:
+                atual = VersaoFila.atual()
+                # Na primeira leitura também: cobre alterações entre a leitura
+                # inicial de uma conexão e a partida da thread
+                if atual != versao:
+                    publicar_kpis()
+                    versao = atual
+            except Exception:
+                logger.exception("Falha ao verificar alterações da fila para o SSE")
+            time.sleep(INTERVALO)
+    finally:
+        with _vigia_lock:
+            _vigia_ativa = False
+        connection.close()
@@ -0,0 +1,397 @@
+# fila_cirurgica/indicadores.py
+"""
+Indicadores agregados da fila, usados pelo dashboard do portal, pela página
+pública de indicadores e pelo admin de `IndicadorEspecialidade`.
+
+Critério único para as três telas: KPIs, distribuição por especialidade e
+rankings por procedimento consideram apenas entradas ativas; o gráfico
+mensal conta todas as entradas criadas no período (ativas ou não).
+
+Os números saem de `ResumoDiarioFila` (consolidado por
+`consolidar_indicadores`); sem resumo consolidado, são calculados direto
+sobre a fila. Os percentis de espera (p50/p90/p99, em dias) não são
+somáveis e vêm sempre da fila. Os cartões de KPI vêm de `ContadorFila`,
+mantido a cada gravação, quando ele já foi reconciliado.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connections, transaction
+from django.db.models import (
+    Aggregate, Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, Now, TruncMonth
+from django.utils.timezone import localdate, localtime, make_aware, now
+
+from .models import ContadorFila, ListaEsperaCirurgica, ResumoDiarioFila, VersaoFila
+
+TOP_PROCEDIMENTOS = 10
+MESES_PADRAO = 3
+MESES_MAXIMO = 36
+# Percentis do tempo de espera; o ranking é pelo p90.
+PERCENTIS = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class PercentilCont(Aggregate):
+    """`percentile_cont(fração) WITHIN GROUP (ORDER BY expressão)` do PostgreSQL."""
+    function = "percentile_cont"
+    template = "%(function)s(%(fracao)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, fracao, **extra):
+        super().__init__(expression, fracao=float(fracao), **extra)
+
+
+def periodo_meses(valor):
+    """Quantidade de meses do gráfico mensal a partir de um parâmetro de URL."""
+    try:
+        meses = int(valor)
+    except (TypeError, ValueError):
+        return MESES_PADRAO
+    return min(max(meses, 1), MESES_MAXIMO)
+
+
+def _meses_do_periodo(hoje, meses):
+    """[(rótulo, início, fim)] dos últimos `meses` meses civis, incluindo o atual."""
+    inicio = hoje.replace(day=1)
+    for _ in range(meses - 1):
+        inicio = (inicio - timedelta(days=1)).replace(day=1)
+    periodo = []
+    while inicio <= hoje:
+        proximo = (inicio + timedelta(days=32)).replace(day=1)
+        periodo.append((inicio.strftime("%b/%Y"), inicio, proximo))
+        inicio = proximo
+    return periodo
+
+
+def _inicio_do_dia(dia):
+    return make_aware(datetime.combine(dia, time.min))
+
+
+def indicadores_fila(meses=MESES_PADRAO):
+    """
+    Retorna os KPIs e as séries dos gráficos com as chaves usadas pelos
+    templates; `meses` é o período do gráfico mensal.
+    """
+    periodo = _meses_do_periodo(localdate(), meses)
+    contadores = ContadorFila.valores()
+    dados = _indicadores_consolidados(periodo, contadores)
+    if dados is None:
+        dados = _indicadores_ao_vivo(periodo, contadores)
+    dados["meses"] = meses
+    return dados
+
+
+def _expressoes_kpis():
+    """Agregações dos cartões de KPI (as chaves de `ContadorFila.CHAVES`)."""
+    ativos = Q(ativo=True)
+    return {
+        "pacientes_na_fila": Count("paciente", distinct=True, filter=ativos),
+        "especialidades_na_fila": Count("especialidade", distinct=True, filter=ativos),
+        "procedimentos_na_fila": Count("procedimento", distinct=True, filter=ativos),
+        # Medida judicial nula conta como False, como em ContadorFila e no resumo
+        "count_eletivos": Count("id", filter=ativos & Q(prioridade="SEM") & ~Q(medida_judicial=True)),
+        "count_oncologicos": Count("id", filter=ativos & Q(prioridade="ONC")),
+        "count_judicializados": Count("id", filter=ativos & Q(medida_judicial=True)),
+    }
+
+
+def kpis_fila():
+    """KPIs dos cartões: de `ContadorFila` ou, sem contadores, direto na fila."""
+    return ContadorFila.valores() or ListaEsperaCirurgica.objects.aggregate(**_expressoes_kpis())
+
+
+def reconciliar_contadores():
+    """
+    Recalcula os KPIs direto na fila e corrige em `ContadorFila` os que
+    divergirem (ou ainda não existirem). Retorna {chave: (antes, depois)}
+    das correções.
+
+    As linhas dos contadores ficam bloqueadas durante o recálculo: saves
+    concorrentes aplicam seus incrementos depois, sobre o valor corrigido.
+    """
+    with transaction.atomic():
+        atuais = dict(ContadorFila.objects.select_for_update().values_list("chave", "valor"))
+        esperados = ListaEsperaCirurgica.objects.aggregate(**_expressoes_kpis())
+        correcoes = {
+            chave: (atuais.get(chave), valor)
+            for chave, valor in esperados.items()
+            if atuais.get(chave) != valor
+        }
+        for chave, (_antes, valor) in correcoes.items():
+            ContadorFila.objects.update_or_create(chave=chave, defaults={"valor": valor})
+    if correcoes:
+        VersaoFila.incrementar()
+    return correcoes
+
+
+def _indicadores_consolidados(periodo, contadores=None):
+    """
+    A partir do último dia de `ResumoDiarioFila`: o estoque por categoria
+    dá KPIs, distribuição e ranking por quantidade; a soma das entradas
+    diárias dá o gráfico mensal. Só pacientes distintos e tempo de espera
+    (que não são somáveis) vêm da fila. None se não houver resumo.
+    Com `contadores`, os KPIs vêm deles (mais atuais que o resumo).
+    """
+    ultimo_dia = Subquery(ResumoDiarioFila.objects.order_by("-data").values("data")[:1])
+    estoque = list(
+        ResumoDiarioFila.objects.filter(data=ultimo_dia, estoque_ativo__gt=0)
+        .values_list(
+            "especialidade_id", "especialidade__nome_especialidade",
+            "procedimento_id", "procedimento__nome",
+            "prioridade", "medida_judicial", "estoque_ativo",
+        )
+    )
+    if not estoque:
+        return None
+
+    por_especialidade, por_procedimento = Counter(), Counter()
+    especialidades, procedimentos = set(), set()
+    eletivos = oncologicos = judicializados = 0
+    for esp_id, esp_nome, proc_id, proc_nome, prioridade, judicial, total in estoque:
+        especialidades.add(esp_id)
+        procedimentos.add(proc_id)
+        por_especialidade[esp_nome or "—"] += total
+        por_procedimento[proc_nome or "—"] += total
+        eletivos += total if prioridade == "SEM" and not judicial else 0
+        oncologicos += total if prioridade == "ONC" else 0
+        judicializados += total if judicial else 0
+
+    _, inicio, _ = periodo[0]
+    por_mes = {
+        row["mes"]: row["total"]
+        for row in ResumoDiarioFila.objects.filter(data__gte=inicio)
+        .annotate(mes=TruncMonth("data"))
+        .values("mes")
+        .annotate(total=Sum("entradas"))
+    }
+
+    labels = sorted(por_especialidade)
+    data = [por_especialidade[nome] for nome in labels]
+    total_geral = sum(data) or 1
+    por_quantidade = por_procedimento.most_common(TOP_PROCEDIMENTOS)
+
+    kpis = contadores or {
+        "pacientes_na_fila": (
+            ListaEsperaCirurgica.objects.filter(ativo=True)
+            .aggregate(total=Count("paciente", distinct=True))["total"]
+        ),
+        "especialidades_na_fila": len(especialidades),
+        "procedimentos_na_fila": len(procedimentos),
+        "count_eletivos": eletivos,
+        "count_oncologicos": oncologicos,
+        "count_judicializados": judicializados,
+    }
+    return {
+        **kpis,
+        "labels": labels,
+        "data": data,
+        "percentages": [round((v / total_geral) * 100, 2) for v in data],
+        "labels_bar": [rotulo for rotulo, _inicio, _fim in periodo],
+        "data_bar": [por_mes.get(inicio, 0) for _rotulo, inicio, _fim in periodo],
+        "labels_proc_count": [nome for nome, _ in por_quantidade],
+        "data_proc_count": [total for _, total in por_quantidade],
+        "espera_especialidades": percentis_espera("especialidade__nome_especialidade"),
+        "espera_procedimentos": percentis_espera("procedimento__nome"),
+    }
+
+
+def _indicadores_ao_vivo(periodo, contadores=None):
+    """
+    Direto sobre a fila: uma agregação condicional para os KPIs (se não
+    vierem `contadores`) e o gráfico mensal, dois agrupamentos
+    (especialidade e procedimento) e os percentis de espera.
+    """
+    ativos = Q(ativo=True)
+
+    agregados = ListaEsperaCirurgica.objects.aggregate(
+        **({} if contadores else _expressoes_kpis()),
+        **{
+            f"mes_{i}": Count(
+                "id",
+                filter=Q(data_entrada__gte=_inicio_do_dia(inicio), data_entrada__lt=_inicio_do_dia(fim)),
+            )
+            for i, (_rotulo, inicio, fim) in enumerate(periodo)
+        },
+    )
+
+    # Pizza — distribuição por especialidade
+    dist = list(
+        ListaEsperaCirurgica.objects.filter(ativos)
+        .values("especialidade__nome_especialidade")
+        .annotate(total=Count("id"))
+        .order_by("especialidade__nome_especialidade")
+    )
+    data = [row["total"] for row in dist]
+    total_geral = sum(data) or 1
+
+    # Procedimentos — top por quantidade, cortado no banco
+    por_quantidade = list(
+        ListaEsperaCirurgica.objects.filter(ativos)
+        .values("procedimento__nome")
+        .annotate(total=Count("id"))
+        .order_by("-total", "procedimento__nome")[:TOP_PROCEDIMENTOS]
+    )
+
+    kpis = contadores or {chave: agregados[chave] for chave in ContadorFila.CHAVES}
+    return {
+        **kpis,
+        "labels": [row["especialidade__nome_especialidade"] or "—" for row in dist],
+        "data": data,
+        "percentages": [round((v / total_geral) * 100, 2) for v in data],
+        "labels_bar": [rotulo for rotulo, _inicio, _fim in periodo],
+        "data_bar": [agregados[f"mes_{i}"] for i in range(len(periodo))],
+        "labels_proc_count": [row["procedimento__nome"] or "—" for row in por_quantidade],
+        "data_proc_count": [row["total"] for row in por_quantidade],
+        "espera_especialidades": percentis_espera("especialidade__nome_especialidade"),
+        "espera_procedimentos": percentis_espera("procedimento__nome"),
+    }
+
+
+def percentis_espera(campo, limite=TOP_PROCEDIMENTOS):
+    """
+    Tempo de espera (dias) das entradas ativas agrupadas por `campo`
+    (ex.: "procedimento__nome"): os `limite` grupos de maior p90, como
+    {"labels": [...], "p50": [...], "p90": [...], "p99": [...]}.
+
+    No PostgreSQL os percentis, a ordenação e o corte saem do banco
+    (`percentile_cont`); nos demais bancos, calcula com a mesma
+    interpolação em Python.
+    """
+    ativos = ListaEsperaCirurgica.objects.filter(ativo=True)
+    if connections[ativos.db].vendor == "postgresql":
+        espera = ExpressionWrapper(Now() - F("data_entrada"), output_field=DurationField())
+        linhas = (
+            ativos.values(campo)
+            .annotate(**{nome: PercentilCont(espera, fracao) for nome, fracao in PERCENTIS.items()})
+            .order_by("-p90", campo)[:limite]
+        )
+        grupos = [
+            (row[campo], [row[nome].total_seconds() / 86400 for nome in PERCENTIS])
+            for row in linhas
+        ]
+    else:
+        agora = now()
+        esperas = defaultdict(list)
+        for nome, data_entrada in ativos.values_list(campo, "data_entrada").iterator():
+            esperas[nome].append((agora - data_entrada).total_seconds() / 86400)
+        grupos = sorted(
+            (
+                (nome, [_percentil(sorted(valores), fracao) for fracao in PERCENTIS.values()])
+                for nome, valores in esperas.items()
+            ),
+            key=lambda grupo: (-grupo[1][1], grupo[0] or ""),
+        )[:limite]
+
+    return {
+        "labels": [nome or "—" for nome, _ in grupos],
+        **{
+            nome: [round(valores[i]) for _, valores in grupos]
+            for i, nome in enumerate(PERCENTIS)
+        },
+    }
+
+
+def _percentil(valores, fracao):
+    """Percentil de `valores` (ordenados) com interpolação linear, como `percentile_cont`."""
+    posicao = fracao * (len(valores) - 1)
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicao - inferior)
+
+
+def consolidar_resumos(desde=None):
+    """
+    Preenche `ResumoDiarioFila` de `desde` até hoje e retorna quantas linhas
+    gravou.
+
+    Há uma linha por dia × categoria apenas quando houve entrada ou saída;
+    no último dia consolidado (hoje) toda categoria com estoque tem linha,
+    que é o que os dashboards leem.
+
+    Sem `desde`, continua do último dia consolidado (refeito, pois pode ter
+    sido gravado pela metade); na primeira execução, começa na entrada mais
+    antiga.
+
+    Só entradas e saídas são acumuladas por dia. O estoque de hoje vem da
+    fila a cada execução (um agrupamento por categoria), então mudanças de
+    prioridade ou de medida judicial e reativações nunca deixam o resumo
+    defasado; o dos dias anteriores é o de hoje desfeito dia a dia pelas
+    entradas e saídas seguintes.
+
+    A data de saída é o primeiro registro histórico inativo da entrada;
+    entradas inativas sem esse registro (cargas antigas) contam como entrada
+    mas não como saída. As categorias são as atuais de cada entrada.
+    """
+    hoje = localdate()
+    if desde is None:
+        desde = ResumoDiarioFila.objects.aggregate(ultimo=Max("data"))["ultimo"]
+    if desde is None:
+        primeira = ListaEsperaCirurgica.objects.aggregate(primeira=Min("data_entrada"))["primeira"]
+        if primeira is None:
+            return 0
+        desde = localtime(primeira).date()
+    inicio = _inicio_do_dia(desde)
+
+    campos_chave = ("especialidade_id", "procedimento_id", "prioridade", "medida_judicial")
+    fechamento = {
+        (esp_id, proc_id, prioridade, judicial): total
+        for esp_id, proc_id, prioridade, judicial, total in ListaEsperaCirurgica.objects.filter(ativo=True)
+        .annotate(judicial=Coalesce("medida_judicial", Value(False)))
+        .order_by()
+        .values_list("especialidade_id", "procedimento_id", "prioridade", "judicial")
+        .annotate(total=Count("id"))
+    }
+
+    saida_por_id = dict(
+        ListaEsperaCirurgica.history.filter(ativo=False)
+        .order_by()
+        .values("id")
+        .annotate(saida=Min("history_date"))
+        .filter(saida__gte=inicio)
+        .values_list("id", "saida")
+    )
+
+    # {categoria: {dia: [entradas, saídas]}}
+    movimento = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    movimentadas = (
+        ListaEsperaCirurgica.objects.filter(Q(data_entrada__gte=inicio) | Q(pk__in=list(saida_por_id)))
+        .values_list("id", *campos_chave, "data_entrada", "ativo")
+    )
+    for pk, esp_id, proc_id, prioridade, judicial, data_entrada, ativo in movimentadas.iterator(chunk_size=2000):
+        dias = movimento[esp_id, proc_id, prioridade, bool(judicial)]
+        dia_entrada = localtime(data_entrada).date()
+        if dia_entrada >= desde:
+            dias[dia_entrada][0] += 1
+        saida = None if ativo else saida_por_id.get(pk)
+        if saida:
+            dias[localtime(saida).date()][1] += 1
+
+    linhas = []
+    for chave in set(fechamento) | set(movimento):
+        esp_id, proc_id, prioridade, judicial = chave
+        dias = movimento.get(chave, {})
+        if fechamento.get(chave) and hoje not in dias:
+            dias[hoje] = [0, 0]
+        # Do fechamento de hoje para trás: o estoque de um dia é o do dia
+        # seguinte sem as entradas e com as saídas dele
+        atual = fechamento.get(chave, 0)
+        for dia in sorted(dias, reverse=True):
+            entradas, saidas = dias[dia]
+            linhas.append(ResumoDiarioFila(
+                data=dia,
+                especialidade_id=esp_id,
+                procedimento_id=proc_id,
+                prioridade=prioridade,
+                medida_judicial=judicial,
+                entradas=entradas,
+                saidas=saidas,
+                estoque_ativo=max(atual, 0),
+            ))
+            atual += saidas - entradas
+
+    with transaction.atomic():
+        ResumoDiarioFila.objects.filter(data__gte=desde).delete()
+        ResumoDiarioFila.objects.bulk_create(linhas, batch_size=5000)
+    # Os indicadores em cache foram calculados sobre o resumo anterior
+    VersaoFila.incrementar()
+    return len(linhas)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.cache import atualizar_consultas_publicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Remonta as respostas da consulta pública marcadas como pendentes por alterações da fila. "
+        "Agende a cada minuto."
+    )
+
+    def handle(self, *args, **options):
+        remontadas = atualizar_consultas_publicas()
+        self.stdout.write(self.style.SUCCESS(f"{remontadas} consulta(s) pública(s) remontada(s)."))
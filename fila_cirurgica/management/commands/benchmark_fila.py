@@ -0,0 +1,135 @@
+import json
+import math
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from fila_cirurgica.models import ConsultaPublica, ListaEsperaCirurgica
+from fila_cirurgica.sintetico import gerar_fila_sintetica
+from portal.pagination import codificar_cursor
+
+PERCENTIS = (50, 90, 99)
+
+
+def percentil(valores, p):
+    """Percentil por posto mais próximo (valores já ordenados)."""
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p90/p99) e número de consultas das operações e telas da fila em escalas "
+        "sintéticas. Roda num banco de teste descartável (test_<NAME>), nunca no banco configurado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escalas", type=int, nargs="+", default=[10_000, 100_000, 500_000],
+            help="Tamanhos da fila a medir (padrão: 10000 100000 500000).",
+        )
+        parser.add_argument("--repeticoes", type=int, default=30, help="Execuções por cenário (padrão: 30).")
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Mantém o banco de teste (e os dados gerados) para a próxima execução.",
+        )
+        parser.add_argument("--json", dest="arquivo_json", help="Grava os resultados também neste arquivo JSON.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        nome_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"])
+        resultados = {}
+        try:
+            usuario, _ = get_user_model().objects.get_or_create(
+                username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+            )
+            cliente = Client(SERVER_NAME="localhost")
+            cliente.force_login(usuario)
+
+            for escala in sorted(options["escalas"]):
+                atual = ListaEsperaCirurgica.objects.count()
+                if atual < escala:
+                    self.stdout.write(f"Gerando {escala - atual} entradas sintéticas...")
+                    gerar_fila_sintetica(escala - atual, semente=escala)
+                total = ListaEsperaCirurgica.objects.count()
+                resultados[total] = self._medir(cliente, options["repeticoes"])
+                self._imprimir(total, resultados[total])
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        if options["arquivo_json"]:
+            with open(options["arquivo_json"], "w", encoding="utf-8") as arquivo:
+                json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+
+    def _cenarios(self, cliente):
+        fila = ListaEsperaCirurgica.objects
+        ativos = fila.filter(ativo=True).count()
+        ultimo = fila.filter(ativo=True).order_by("-posicao").select_related("paciente", "especialidade").first()
+        if ultimo is None:
+            raise CommandError("A fila não tem entradas ativas para medir.")
+        profundo = fila.get(ativo=True, posicao=max(1, int(ativos * 0.9)))
+        offset = profundo.posicao - 1
+        cursor = codificar_cursor(profundo.chave_fila())
+
+        url_lista = reverse("portal:fila_list")
+        url_consulta = f"{reverse('externo:consulta_posicao')}?prontuario={ultimo.paciente.prontuario}"
+
+        def get(url):
+            resposta = cliente.get(url)
+            if resposta.status_code != 200:
+                raise CommandError(f"{url} respondeu {resposta.status_code}")
+
+        def consulta_fria():
+            # Sem a resposta pronta nem as posições em cache: monta tudo
+            cache.clear()
+            ConsultaPublica.objects.filter(prontuario=ultimo.paciente.prontuario).delete()
+            get(url_consulta)
+
+        return [
+            ("get_posicao (materializada)", lambda: fila.get(pk=ultimo.pk).get_posicao()),
+            ("get_posicao (cálculo por COUNT)", lambda: ultimo._calcular_posicao()),
+            ("ordered() · 1ª página", lambda: list(fila.ordered()[:10])),
+            ("ordered() · página a 90% (OFFSET)", lambda: list(fila.ordered()[offset:offset + 10])),
+            ("ordered() · página a 90% (cursor)", lambda: fila.ordered().pagina_apos(profundo.chave_fila(), 10)),
+            ("consulta_posicao", lambda: get(url_consulta)),
+            ("consulta_posicao (cache frio)", consulta_fria),
+            ("FilaListView · 1ª página", lambda: get(url_lista)),
+            ("FilaListView · página a 90%", lambda: get(f"{url_lista}?apos={cursor}")),
+            (
+                "FilaListView · filtro por especialidade",
+                lambda: get(f"{url_lista}?especialidade={ultimo.especialidade.cod_especialidade}"),
+            ),
+            ("DashboardView", lambda: get(reverse("portal:dashboard"))),
+        ]
+
+    def _medir(self, cliente, repeticoes):
+        resultado = {}
+        for nome, operacao in self._cenarios(cliente):
+            operacao()  # aquecimento
+            tempos, consultas = [], []
+            for _ in range(repeticoes):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    operacao()
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                consultas.append(len(capturadas))
+            tempos.sort()
+            resultado[nome] = {f"p{p}": round(percentil(tempos, p), 2) for p in PERCENTIS}
+            resultado[nome]["consultas"] = max(consultas)
+        return resultado
+
+    def _imprimir(self, total, resultado):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nFila com {total} entradas (ms)"))
+        self.stdout.write(f"{'cenário':<42}{'p50':>9}{'p90':>9}{'p99':>9}{'consultas':>11}")
+        for nome, medidas in resultado.items():
+            self.stdout.write(
+                f"{nome:<42}{medidas['p50']:>9.1f}{medidas['p90']:>9.1f}{medidas['p99']:>9.1f}"
+                f"{medidas['consultas']:>11}"
+            )
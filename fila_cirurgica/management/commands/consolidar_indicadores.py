@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.indicadores import consolidar_resumos
+
+
+class Command(BaseCommand):
+    help = (
+        "Consolida os resumos diários da fila (entradas, saídas e estoque ativo por especialidade, "
+        "procedimento e prioridade) lidos pelos dashboards. Incremental; agende de hora em hora."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            type=date.fromisoformat,
+            help="Reconsolida a partir desta data (AAAA-MM-DD) em vez de continuar do último dia.",
+        )
+
+    def handle(self, *args, **options):
+        linhas = consolidar_resumos(desde=options["desde"])
+        self.stdout.write(self.style.SUCCESS(f"Resumos consolidados: {linhas} linhas gravadas."))
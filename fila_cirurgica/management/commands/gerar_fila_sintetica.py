@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.sintetico import gerar_fila_sintetica
+
+
+class Command(BaseCommand):
+    help = (
+        "Acrescenta entradas sintéticas na fila (com pacientes, especialidades, procedimentos e médicos "
+        "sintéticos). Use apenas em bancos de teste/homologação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("entradas", type=int, help="Quantidade de entradas a acrescentar.")
+        parser.add_argument("--semente", type=int, default=0, help="Semente do gerador aleatório (padrão: 0).")
+
+    def handle(self, *args, **options):
+        total = gerar_fila_sintetica(options["entradas"], semente=options["semente"])
+        self.stdout.write(self.style.SUCCESS(f"Entradas sintéticas geradas. Total na fila: {total}"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fila_cirurgica.previsao import JANELA_DIAS, calcular_previsoes
+
+
+class Command(BaseCommand):
+    help = "Recalcula a data prevista de cirurgia de todas as entradas ativas (em lote). Agende uma vez ao dia."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--janela",
+            type=int,
+            default=JANELA_DIAS,
+            help=f"Dias de histórico de saídas usados na taxa de cada procedimento (padrão: {JANELA_DIAS}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["janela"] < 1:
+            raise CommandError("--janela deve ser de pelo menos 1 dia.")
+        total = calcular_previsoes(janela_dias=options["janela"])
+        self.stdout.write(self.style.SUCCESS(f"Previsões calculadas: {total} entradas com data prevista."))
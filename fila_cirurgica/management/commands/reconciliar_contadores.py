@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.indicadores import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os KPIs da fila (ContadorFila) direto nas entradas e corrige divergências. "
+        "Rode uma vez após o deploy e agende diariamente."
+    )
+
+    def handle(self, *args, **options):
+        correcoes = reconciliar_contadores()
+        for chave, (antes, depois) in sorted(correcoes.items()):
+            self.stdout.write(f"{chave}: {antes} -> {depois}")
+        self.stdout.write(self.style.SUCCESS(f"Contadores reconciliados: {len(correcoes)} corrigido(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.models import SnapshotFila
+
+
+class Command(BaseCommand):
+    help = "Grava a ordem atual da fila ativa como snapshot do dia (uma linha por dia). Agende uma vez ao dia."
+
+    def handle(self, *args, **options):
+        snapshot = SnapshotFila.registrar()
+        self.stdout.write(self.style.SUCCESS(f"Snapshot registrado: {snapshot}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from fila_cirurgica.models import ListaEsperaCirurgica
+
+
+class Command(BaseCommand):
+    help = "Recalcula a ordem de prioridade e a posição materializadas de todas as entradas da fila (corrige divergências)."
+
+    def handle(self, *args, **options):
+        alterados = ListaEsperaCirurgica.objects.reindexar_posicoes()
+        self.stdout.write(self.style.SUCCESS(f"Posições recalculadas. Entradas corrigidas: {alterados}"))
@@ -0,0 +1,57 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from fila_cirurgica.catalogos import (
+    CATALOGOS,
+    carregar_especialidades_procedimentos,
+    especialidades_procedimentos_do_aghu,
+    sincronizar_catalogo,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia do AGHU os catálogos de especialidades, procedimentos e profissionais usados pelo "
+        "autocomplete local. Incremental (só o alterado desde a última execução); agende diariamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "catalogos",
+            nargs="*",
+            help=f"Catálogos a sincronizar: {', '.join(CATALOGOS)} (padrão: todos).",
+        )
+        parser.add_argument(
+            "--completo",
+            action="store_true",
+            help="Ignora a última sincronização e relê o catálogo inteiro.",
+        )
+        parser.add_argument(
+            "--relacoes",
+            action="store_true",
+            help="Recarrega também os procedimentos de cada especialidade (uma busca por especialidade).",
+        )
+
+    def handle(self, *args, **options):
+        nomes = options["catalogos"] or list(CATALOGOS)
+        desconhecidos = set(nomes) - set(CATALOGOS)
+        if desconhecidos:
+            raise CommandError(f"Catálogo(s) desconhecido(s): {', '.join(sorted(desconhecidos))}")
+        for nome in nomes:
+            try:
+                gravados = sincronizar_catalogo(nome, completo=options["completo"])
+            except requests.RequestException as e:
+                raise CommandError(f"Falha ao ler {nome} do AGHU: {e}")
+            self.stdout.write(f"{nome}: {gravados} registro(s) gravado(s)")
+        if options["relacoes"]:
+            try:
+                # Tudo lido antes de abrir a transação da carga
+                pares = list(especialidades_procedimentos_do_aghu())
+            except requests.RequestException as e:
+                raise CommandError(f"Falha ao ler os procedimentos por especialidade do AGHU: {e}")
+            try:
+                gravados = carregar_especialidades_procedimentos(pares)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"especialidade→procedimento: {gravados} par(es) gravado(s)")
+        self.stdout.write(self.style.SUCCESS("Catálogos sincronizados."))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:24
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, When
+
+
+def popular_posicoes(apps, schema_editor):
+    ListaEsperaCirurgica = apps.get_model('fila_cirurgica', 'ListaEsperaCirurgica')
+    ids_em_ordem = (
+        ListaEsperaCirurgica.objects.filter(ativo=True)
+        .annotate(
+            prioridade_num=Case(
+                When(medida_judicial=True, then=0),
+                When(prioridade='ONC', then=1),
+                When(prioridade='BRE', then=2),
+                default=3,
+                output_field=IntegerField(),
+            ),
+        )
+        .order_by('prioridade_num', 'data_entrada', 'id')
+        .values_list('id', flat=True)
+    )
+    objs = [
+        ListaEsperaCirurgica(pk=obj_id, posicao=idx + 1)
+        for idx, obj_id in enumerate(ids_em_ordem)
+    ]
+    ListaEsperaCirurgica.objects.bulk_update(objs, ['posicao'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0009_historicallistaesperacirurgica_prioridade_justificativa_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listaesperacirurgica',
+            name='posicao',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Posição na fila'),
+        ),
+        migrations.RunPython(popular_posicoes, migrations.RunPython.noop),
+    ]
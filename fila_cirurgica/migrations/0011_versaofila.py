@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0010_listaesperacirurgica_posicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoFila',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão da Fila',
+                'verbose_name_plural': 'Versões da Fila',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:28
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, When
+
+
+def popular_prioridade_num(apps, schema_editor):
+    ListaEsperaCirurgica = apps.get_model('fila_cirurgica', 'ListaEsperaCirurgica')
+    ListaEsperaCirurgica.objects.update(
+        prioridade_num=Case(
+            When(medida_judicial=True, then=0),
+            When(prioridade='ONC', then=1),
+            When(prioridade='BRE', then=2),
+            When(ativo=False, then=4),
+            default=3,
+            output_field=IntegerField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0011_versaofila'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listaesperacirurgica',
+            name='prioridade_num',
+            field=models.PositiveSmallIntegerField(default=3, editable=False, verbose_name='Ordem de prioridade'),
+        ),
+        migrations.RunPython(popular_prioridade_num, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listaesperacirurgica',
+            index=models.Index(fields=['-ativo', 'prioridade_num', 'data_entrada', 'id'], name='fila_ordem_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:29
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0012_listaesperacirurgica_prioridade_num'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotFila',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None, verbose_name='Entradas ativas em ordem')),
+            ],
+            options={
+                'verbose_name': 'Snapshot diário da fila',
+                'verbose_name_plural': 'Snapshots diários da fila',
+                'ordering': ['data'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0013_snapshotfila'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisaoCirurgia',
+            fields=[
+                ('entrada', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='previsao', serialize=False, to='fila_cirurgica.listaesperacirurgica', verbose_name='Entrada na fila')),
+                ('data_prevista', models.DateField(blank=True, null=True, verbose_name='Data prevista')),
+                ('taxa_diaria', models.FloatField(default=0, verbose_name='Cirurgias/dia do procedimento')),
+                ('calculado_em', models.DateTimeField(verbose_name='Calculado em')),
+            ],
+            options={
+                'verbose_name': 'Previsão de cirurgia',
+                'verbose_name_plural': 'Previsões de cirurgia',
+            },
+        ),
+    ]
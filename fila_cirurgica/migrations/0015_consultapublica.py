@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0014_previsaocirurgia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultaPublica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prontuario', models.CharField(max_length=20, unique=True, verbose_name='Prontuário')),
+                ('versao', models.PositiveBigIntegerField(verbose_name='Versão da fila')),
+                ('entradas_ativas', models.JSONField(default=list, verbose_name='Entradas ativas')),
+                ('entradas_inativas', models.JSONField(default=list, verbose_name='Entradas inativas')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Consulta pública',
+                'verbose_name_plural': 'Consultas públicas',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0015_consultapublica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiarioFila',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('prioridade', models.CharField(choices=[('ONC', 'Paciente Oncológico'), ('BRE', 'Com Prioridade'), ('SEM', 'Sem Prioridade')], max_length=3)),
+                ('medida_judicial', models.BooleanField(default=False, verbose_name='Medida Judicial')),
+                ('entradas', models.PositiveIntegerField(default=0, verbose_name='Entradas no dia')),
+                ('saidas', models.PositiveIntegerField(default=0, verbose_name='Saídas no dia')),
+                ('estoque_ativo', models.PositiveIntegerField(default=0, verbose_name='Ativos ao fim do dia')),
+                ('especialidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='fila_cirurgica.especialidadeaghu')),
+                ('procedimento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='fila_cirurgica.procedimentoaghu')),
+            ],
+            options={
+                'verbose_name': 'Resumo diário da fila',
+                'verbose_name_plural': 'Resumos diários da fila',
+                'constraints': [models.UniqueConstraint(fields=('data', 'especialidade', 'procedimento', 'prioridade', 'medida_judicial'), name='resumo_diario_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0016_resumodiariofila'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorFila',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=40, unique=True, verbose_name='Indicador')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Contador da Fila',
+                'verbose_name_plural': 'Contadores da Fila',
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:03
+
+import logging
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+CATALOGOS = {
+    'EspecialidadeAghu': 'nome_especialidade',
+    'ProcedimentoAghu': 'nome',
+    'ProfissionalAghu': 'nome',
+}
+
+
+def normalizar_busca(texto):
+    sem_acento = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.casefold().split())
+
+
+def popular_nome_busca(apps, schema_editor):
+    for modelo, campo in CATALOGOS.items():
+        Modelo = apps.get_model('fila_cirurgica', modelo)
+        objetos = list(Modelo.objects.only('pk', campo))
+        for obj in objetos:
+            obj.nome_busca = normalizar_busca(getattr(obj, campo))
+        Modelo.objects.bulk_update(objetos, ['nome_busca'], batch_size=1000)
+
+
+def criar_indices_trigrama(apps, schema_editor):
+    # Índices de trigramas atendem o LIKE '%termo%' do autocomplete local.
+    # A extensão pg_trgm é do contrib: sem ela (ou sem permissão para
+    # criá-la), a busca continua funcionando, só sem índice.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for modelo in CATALOGOS:
+                tabela = apps.get_model('fila_cirurgica', modelo)._meta.db_table
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {tabela}_busca_trgm '
+                    f'ON {tabela} USING gin (nome_busca gin_trgm_ops)'
+                )
+    except DatabaseError as e:
+        logger.warning(
+            'pg_trgm ou os índices de trigramas não foram criados (%s); '
+            'o autocomplete local vai funcionar sem índice.', e,
+        )
+
+
+def remover_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for modelo in CATALOGOS:
+        tabela = apps.get_model('fila_cirurgica', modelo)._meta.db_table
+        schema_editor.execute(f'DROP INDEX IF EXISTS {tabela}_busca_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0017_contadorfila'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='especialidadeaghu',
+            name='atualizado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Atualizado no AGHU em'),
+        ),
+        migrations.AddField(
+            model_name='especialidadeaghu',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='procedimentoaghu',
+            name='atualizado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Atualizado no AGHU em'),
+        ),
+        migrations.AddField(
+            model_name='procedimentoaghu',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='profissionalaghu',
+            name='atualizado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Atualizado no AGHU em'),
+        ),
+        migrations.AddField(
+            model_name='profissionalaghu',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(popular_nome_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indices_trigrama, remover_indices_trigrama),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0018_catalogos_locais'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='especialidadeaghu',
+            name='procedimentos',
+            field=models.ManyToManyField(blank=True, related_name='especialidades', to='fila_cirurgica.procedimentoaghu', verbose_name='Procedimentos'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fila_cirurgica', '0019_especialidadeaghu_procedimentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultapublica',
+            name='pendente',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Aguardando remontagem'),
+        ),
+    ]
@@ -1,6 +1,13 @@
 # models.py
-from django.db import models
-from django.db.models import Case, When, IntegerField
+import json
+import unicodedata
+from datetime import timedelta
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, models, transaction
+from django.db.models import BigIntegerField, Case, F, Func, IntegerField, Q, Value, When, Window
+from django.db.models.functions import Cast, RowNumber
+from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
 
@@ -24,7 +31,39 @@ class PacienteAghu(models.Model):
         verbose_name_plural = "Pacientes"
 
 
-class ProcedimentoAghu(models.Model):
+def normalizar_busca(texto):
+    """Texto sem acentos, em minúsculas e com espaços simples, para busca."""
+    sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(sem_acento.casefold().split())
+
+
+class CatalogoAghu(models.Model):
+    """
+    Campos comuns às tabelas espelhadas do AGHU (ver `catalogos.py`):
+    o nome normalizado usado pelo autocomplete local e a data de alteração
+    no AGHU, que marca até onde a sincronização já chegou.
+    """
+    CAMPO_NOME = "nome"
+
+    nome_busca = models.CharField(max_length=255, blank=True, editable=False)
+    atualizado_em = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Atualizado no AGHU em"
+        )
+
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar_busca(getattr(self, self.CAMPO_NOME))
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "nome_busca"}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class ProcedimentoAghu(CatalogoAghu):
     codigo = models.CharField(
         max_length=20,
         unique=True,
@@ -43,7 +82,9 @@ class ProcedimentoAghu(models.Model):
         verbose_name_plural = "Procedimentos"
 
 
-class EspecialidadeAghu(models.Model):
+class EspecialidadeAghu(CatalogoAghu):
+    CAMPO_NOME = "nome_especialidade"
+
     cod_especialidade = models.CharField(
         max_length=10,
         unique=True,
@@ -53,6 +94,14 @@ class EspecialidadeAghu(models.Model):
         max_length=255,
         verbose_name="Nome da Especialidade"
         )
+    # Procedimentos que podem ser registrados na especialidade (carregados do
+    # CSV do AGHU ou da API, ver `catalogos.carregar_especialidades_procedimentos`)
+    procedimentos = models.ManyToManyField(
+        ProcedimentoAghu,
+        related_name="especialidades",
+        blank=True,
+        verbose_name="Procedimentos"
+        )
 
     def __str__(self):
         return self.nome_especialidade
@@ -62,7 +111,7 @@ class EspecialidadeAghu(models.Model):
         verbose_name_plural = "Especialidades"
 
 
-class ProfissionalAghu(models.Model):
+class ProfissionalAghu(CatalogoAghu):
     matricula = models.CharField(
         max_length=10,
         unique=True,
@@ -81,19 +130,119 @@ class ProfissionalAghu(models.Model):
         verbose_name_plural = "Médicos"
 
 
+# Sub-filas em que também se calcula a posição (ver `with_posicao`).
+PARTICOES_FILA = ('especialidade', 'procedimento', 'medico')
+
+# Ordem da fila (ver `ordered()` e o índice `fila_ordem_idx`).
+ORDEM_FILA = ('-ativo', 'prioridade_num', 'data_entrada', 'id')
+
+
+class Linha(Func):
+    """Construtor de linha do SQL, `(a, b, c)`, para comparações de tupla."""
+    template = '(%(expressions)s)'
+    output_field = models.Field()
+
+
+def prioridade_num_expr():
+    """Regra de `prioridade_num` em SQL (espelha `ListaEsperaCirurgica._prioridade_num`)."""
+    return Case(
+        When(medida_judicial=True, then=0),
+        When(prioridade='ONC', then=1),
+        When(prioridade='BRE', then=2),
+        When(ativo=False, then=4),
+        default=3,
+        output_field=IntegerField()
+    )
+
+
 class ListaEsperaCirurgicaQuerySet(models.QuerySet):
-    def with_prioridade_index(self):
-
-        return self.annotate(
-            prioridade_num=Case(
-                When(medida_judicial=True, then=0),
-                When(prioridade='ONC', then=1),
-                When(prioridade='BRE', then=2),
-                When(ativo=False, then=4),
-                default=3,
-                output_field=IntegerField()
-            ),
+    def atualizar_prioridade_num(self):
+        """
+        Regrava `prioridade_num` onde ele divergir das colunas de origem.
+
+        save() já mantém a coluna; isto só é necessário depois de um
+        `QuerySet.update()` em prioridade/medida_judicial/ativo.
+        Retorna a quantidade de linhas corrigidas.
+        """
+        return (
+            self.alias(prioridade_calculada=prioridade_num_expr())
+            .exclude(prioridade_num=F('prioridade_calculada'))
+            .update(prioridade_num=prioridade_num_expr())
+        )
+
+    def with_posicao(self, *particoes):
+        """
+        Anota `posicao_fila` com ROW_NUMBER() na mesma ordem de `ordered()`,
+        numerando ativos e inativos separadamente.
+
+        Para cada partição pedida (ver PARTICOES_FILA) anota também
+        `posicao_<particao>`, a posição dentro da sub-fila daquela
+        especialidade/procedimento/médico, na mesma consulta.
+
+        A janela numera apenas as linhas deste queryset: para obter a posição
+        na fila inteira, aplique sobre a fila sem filtros (ver
+        `ListaEsperaCirurgicaManager.posicoes`).
+        """
+        ordem = [F('prioridade_num').asc(), F('data_entrada').asc(), F('id').asc()]
+        janelas = {
+            'posicao_fila': Window(RowNumber(), partition_by=[F('ativo')], order_by=ordem),
+        }
+        for particao in particoes:
+            janelas[f'posicao_{particao}'] = Window(
+                RowNumber(),
+                partition_by=[F('ativo'), F(f'{particao}_id')],
+                order_by=ordem,
+            )
+        return self.annotate(**janelas)
+
+    def estimar_total(self, limite_exato=1000):
+        """
+        Total aproximado de linhas pela estimativa do planejador (EXPLAIN),
+        sem COUNT(*). Abaixo de `limite_exato` a contagem exata é barata e
+        é feita no lugar da estimativa. Fora do PostgreSQL, conta.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.count()
+        plano = json.loads(self.order_by().values('pk').explain(format='json'))
+        estimativa = int(plano[0]['Plan']['Plan Rows'])
+        return self.count() if estimativa < limite_exato else estimativa
+
+    def pagina_apos(self, chave, limite):
+        """
+        Até `limite` entradas logo depois de `chave` na ordem de `ordered()`.
+
+        `chave` é a tupla (ativo, prioridade_num, data_entrada, id) de uma
+        entrada (ver `ListaEsperaCirurgica.chave_fila`). Dentro do mesmo
+        `ativo` a condição é uma comparação de linha sobre o restante da
+        chave, que o índice `fila_ordem_idx` resolve como intervalo: o custo
+        não depende de quão fundo está a página.
+        """
+        return self._pagina(chave, limite, depois=True)
+
+    def pagina_antes(self, chave, limite):
+        """Como `pagina_apos`, para as entradas logo antes de `chave` (em ordem)."""
+        return self._pagina(chave, limite, depois=False)
+
+    def _pagina(self, chave, limite, depois):
+        ativo, *resto = chave
+        restante = Linha(*[F(campo) for campo in ORDEM_FILA[1:]])
+        referencia = Linha(*[Value(valor) for valor in resto])
+        lookup = 'gt' if depois else 'lt'
+        qs = self.order_by(*ORDEM_FILA)
+        if not depois:
+            qs = qs.reverse()
+
+        linhas = list(
+            qs.filter(ativo=ativo)
+            .alias(chave_restante=restante)
+            .filter(**{f'chave_restante__{lookup}': referencia})[:limite]
         )
+        # Ativos vêm antes dos inativos: ao esgotar um trecho, continua no outro
+        if len(linhas) < limite and ativo == depois:
+            linhas += list(qs.filter(ativo=not ativo)[:limite - len(linhas)])
+        if not depois:
+            linhas.reverse()
+        return linhas
 
 
 class ListaEsperaCirurgicaManager(models.Manager):
@@ -103,17 +252,82 @@ class ListaEsperaCirurgicaManager(models.Manager):
     def ordered(self):
         return (
             self.get_queryset()
-                .with_prioridade_index()
-                .order_by(
-                    '-ativo',                # ativo primeiro
-                    'prioridade_num',           # primeiro: medida/clinica
-                    'data_entrada',              # por fim: ordem de chegada
-            )
+                .order_by(*ORDEM_FILA)   # ativo primeiro, prioridade, chegada, id
         )
 
+    def reindexar_posicoes(self):
+        """
+        Recalcula a coluna `posicao` de toda a fila a partir de `ordered()`.
+
+        Usado para popular o índice pela primeira vez e para corrigir
+        eventuais divergências. Só grava as linhas cuja posição mudou.
+        Retorna a quantidade de linhas atualizadas.
+        """
+        self.get_queryset().atualizar_prioridade_num()
+        esperado = dict(
+            self.get_queryset().filter(ativo=True)
+            .with_posicao()
+            .values_list('id', 'posicao_fila')
+        )
+        atual = dict(self.get_queryset().values_list('id', 'posicao'))
+
+        alterados = [
+            self.model(pk=obj_id, posicao=esperado.get(obj_id))
+            for obj_id, posicao in atual.items()
+            if esperado.get(obj_id) != posicao
+        ]
+        with transaction.atomic():
+            self.bulk_update(alterados, ['posicao'], batch_size=1000)
+        if alterados:
+            ConsultaPublica.marcar_pendentes()
+        return len(alterados)
+
+    def posicoes(self, ids, *particoes):
+        """
+        Resolve em uma única consulta a posição na fila ativa de cada id
+        (e, opcionalmente, nas sub-filas de `particoes`).
+
+        As janelas de `with_posicao()` são calculadas sobre a fila inteira e
+        só depois restritas aos ids pedidos, então filtros da página não
+        alteram a numeração. Retorna {id: {'posicao_fila': n, ...}}.
+        """
+        ids = list(ids)
+        if not ids:
+            return {}
+
+        campos = ['posicao_fila', *(f'posicao_{particao}' for particao in particoes)]
+        fila = (
+            self.get_queryset().filter(ativo=True)
+            .with_posicao(*particoes)
+            .values('id', *campos)
+        )
+        sql, params = fila.query.sql_with_params()
+        marcadores = ', '.join(['%s'] * len(ids))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, {', '.join(campos)} FROM ({sql}) AS fila WHERE id IN ({marcadores})",
+                [*params, *ids],
+            )
+            return {row[0]: dict(zip(campos, row[1:])) for row in cursor.fetchall()}
+
+    def anotar_posicoes(self, objetos, *particoes):
+        """
+        Preenche `posicao_fila` (e `posicao_<particao>`) em cada objeto de uma
+        página usando `posicoes()`: uma consulta por página, não por linha.
+        Inativos, e partições sem valor (ex.: sem médico), ficam com None.
+        """
+        posicoes = self.posicoes((obj.pk for obj in objetos if obj.ativo), *particoes)
+        for obj in objetos:
+            valores = posicoes.get(obj.pk, {})
+            obj.posicao_fila = valores.get('posicao_fila')
+            for particao in particoes:
+                sem_valor = getattr(obj, f'{particao}_id') is None
+                setattr(obj, f'posicao_{particao}', None if sem_valor else valores.get(f'posicao_{particao}'))
+        return objetos
+
 
 class ListaEsperaCirurgica(models.Model):
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['posicao', 'prioridade_num'])
     
     PRIORIDADE_CHOICES = [
         ('ONC', 'Paciente Oncológico'),
@@ -234,15 +448,86 @@ class ListaEsperaCirurgica(models.Model):
         verbose_name="Motivo da saída da fila"
         )
 
+    # Ordem de prioridade materializada (0 = judicial ... 4 = inativo),
+    # mantida em save(); ver `_prioridade_num` e o índice em Meta.
+    prioridade_num = models.PositiveSmallIntegerField(
+        default=3,
+        editable=False,
+        verbose_name="Ordem de prioridade"
+        )
+
+    # Posição materializada na fila ativa (None para entradas inativas).
+    # Mantida incrementalmente em save(); ver `_atualizar_posicao`.
+    posicao = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        db_index=True,
+        verbose_name="Posição na fila"
+        )
+
     objects = ListaEsperaCirurgicaManager()
 
     class Meta:
         verbose_name = "Entrada da Lista de Espera Cirúrgica"
         verbose_name_plural = "Entradas da Lista de Espera Cirúrgica"
+        indexes = [
+            # Mesma ordem de `ordered()`: permite percorrer a fila pelo índice
+            # em vez de ordenar a tabela inteira.
+            models.Index(
+                fields=['-ativo', 'prioridade_num', 'data_entrada', 'id'],
+                name='fila_ordem_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.paciente} esperando {self.procedimento} em {self.especialidade}"
 
+    def save(self, *args, **kwargs):
+        self.prioridade_num = self._prioridade_num()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'prioridade_num'}
+
+        with transaction.atomic():
+            # A posição nova é contada e o trecho deslocado em seguida: sem
+            # a trava, dois saves simultâneos gravariam posições repetidas.
+            VersaoFila.travar()
+            anterior = None
+            if self.pk:
+                anterior = (
+                    type(self).objects.filter(pk=self.pk)
+                    .values('posicao', *ContadorFila.CAMPOS)
+                    .first()
+                )
+            # A posição gravada pode ter mudado desde que esta instância foi
+            # lida; o save() não pode devolver o valor antigo ao banco.
+            self.posicao = anterior['posicao'] if anterior else None
+            super().save(*args, **kwargs)
+            self._atualizar_posicao(anterior)
+            ContadorFila.registrar_mudanca(self.pk, anterior, self._estado_contadores())
+            self._marcar_consultas(anterior, self._estado_contadores(), self.posicao)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            VersaoFila.travar()
+            pk = self.pk
+            # Estado gravado, não o da instância (que pode estar desatualizada)
+            anterior = (
+                type(self).objects.filter(pk=pk)
+                .values('posicao', *ContadorFila.CAMPOS)
+                .first()
+            )
+            resultado = super().delete(*args, **kwargs)
+            if anterior and anterior['ativo'] and anterior['posicao'] is not None:
+                # Saiu da fila: quem estava atrás sobe uma.
+                type(self).objects.filter(
+                    ativo=True, posicao__gt=anterior['posicao']
+                ).update(posicao=F('posicao') - 1)
+            ContadorFila.registrar_mudanca(pk, anterior, None)
+            self._marcar_consultas(anterior, None, None)
+        return resultado
+
     def get_posicao(self):
         """
         Retorna a posição do objeto na fila, considerando medida judicial e tipo de prioridade.
@@ -250,9 +535,475 @@ class ListaEsperaCirurgica(models.Model):
 
         if not self.ativo:
             return "\\"
-        
-        qs = type(self).objects.ordered().values_list('id', flat=True)
-        return list(qs.filter(ativo=True)).index(self.id) + 1
+
+        if self.posicao is None:
+            # Entrada ainda não indexada: calcula sem materializar.
+            return self._calcular_posicao()
+        return self.posicao
+
+    def chave_fila(self):
+        """Valores de ORDEM_FILA desta entrada, usados como cursor de paginação."""
+        return (self.ativo, self.prioridade_num, self.data_entrada, self.pk)
+
+    def _estado_contadores(self):
+        return {campo: getattr(self, campo) for campo in ContadorFila.CAMPOS}
+
+    @staticmethod
+    def _marcar_consultas(anterior, atual, posicao_nova):
+        """
+        Marca para remontagem as respostas da consulta pública que a
+        passagem de `anterior` para `atual` (dicts com ContadorFila.CAMPOS;
+        None = não existia/foi apagada) muda: a do próprio paciente e, se a
+        ordem ou as sub-filas mudaram, as de quem está entre a posição
+        antiga e a nova (ou dali em diante, em entradas e saídas da fila).
+        """
+        estados = [estado for estado in (anterior, atual) if estado]
+        # Pelo cadastro do paciente: a entrada apagada já não está na fila
+        ConsultaPublica.marcar_pendentes(
+            PacienteAghu.objects.filter(
+                pk__in={estado['paciente_id'] for estado in estados}
+            ).values('prontuario')
+        )
+        ordem = ('ativo', 'prioridade', 'medida_judicial', 'especialidade_id', 'procedimento_id')
+        if anterior and atual and all(anterior[campo] == atual[campo] for campo in ordem):
+            return
+        posicoes = [
+            posicao
+            for posicao in (anterior and anterior['ativo'] and anterior['posicao'], posicao_nova)
+            if posicao
+        ]
+        if not posicoes:
+            return
+        afetadas = Q(ativo=True, posicao__gte=min(posicoes))
+        sub_filas = ('especialidade_id', 'procedimento_id')
+        if len(posicoes) == 2 and all(anterior[campo] == atual[campo] for campo in sub_filas):
+            # Só mudou de lugar na fila: quem está depois das duas posições não se move
+            afetadas &= Q(posicao__lte=max(posicoes))
+        ConsultaPublica.marcar_pendentes(
+            ListaEsperaCirurgica.objects.filter(afetadas).values('paciente__prontuario')
+        )
+
+    def _prioridade_num(self):
+        """Mesmo critério de `prioridade_num_expr`, calculado em Python."""
+        if self.medida_judicial:
+            return 0
+        if self.prioridade == 'ONC':
+            return 1
+        if self.prioridade == 'BRE':
+            return 2
+        if not self.ativo:
+            return 4
+        return 3
+
+    def _calcular_posicao(self):
+        """Conta quantas entradas ativas estão à frente desta na ordem de `ordered()`."""
+        prioridade_num = self._prioridade_num()
+        a_frente = (
+            type(self).objects.filter(ativo=True)
+            .exclude(pk=self.pk)
+            .filter(
+                Q(prioridade_num__lt=prioridade_num)
+                | Q(prioridade_num=prioridade_num, data_entrada__lt=self.data_entrada)
+                | Q(prioridade_num=prioridade_num, data_entrada=self.data_entrada, pk__lt=self.pk)
+            )
+        )
+        return a_frente.count() + 1
+
+    def _atualizar_posicao(self, anterior):
+        """
+        Atualiza a posição materializada desta entrada e desloca apenas o
+        trecho da fila entre a posição antiga e a nova.
+        """
+        chave = {
+            'ativo': self.ativo,
+            'prioridade': self.prioridade,
+            'medida_judicial': self.medida_judicial,
+        }
+        if anterior and all(anterior[campo] == valor for campo, valor in chave.items()):
+            # Nada que afete a ordem mudou (ex.: edição de observações).
+            if not self.ativo or anterior['posicao'] is not None:
+                self.posicao = anterior['posicao']
+                return
+
+        posicao_antiga = anterior['posicao'] if anterior and anterior['ativo'] else None
+        posicao_nova = self._calcular_posicao() if self.ativo else None
+
+        demais = type(self).objects.filter(ativo=True).exclude(pk=self.pk)
+        if posicao_antiga is None and posicao_nova is not None:
+            # Entrou na fila: quem está da nova posição em diante desce uma.
+            demais.filter(posicao__gte=posicao_nova).update(posicao=F('posicao') + 1)
+        elif posicao_antiga is not None and posicao_nova is None:
+            # Saiu da fila: quem estava atrás sobe uma.
+            demais.filter(posicao__gt=posicao_antiga).update(posicao=F('posicao') - 1)
+        elif posicao_antiga is not None and posicao_nova < posicao_antiga:
+            demais.filter(
+                posicao__gte=posicao_nova, posicao__lt=posicao_antiga
+            ).update(posicao=F('posicao') + 1)
+        elif posicao_antiga is not None and posicao_nova > posicao_antiga:
+            demais.filter(
+                posicao__gt=posicao_antiga, posicao__lte=posicao_nova
+            ).update(posicao=F('posicao') - 1)
+
+        type(self).objects.filter(pk=self.pk).update(posicao=posicao_nova)
+        self.posicao = posicao_nova
+
+
+class VersaoFila(models.Model):
+    """
+    Contador incrementado a cada alteração de `ListaEsperaCirurgica`
+    (ver signals.py). Serve de chave para caches derivados da fila: como
+    fica no banco, a mesma versão vale para todos os processos/workers.
+    """
+    valor = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versão da Fila"
+        verbose_name_plural = "Versões da Fila"
+
+    @classmethod
+    def atual(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj.valor
+
+    @classmethod
+    def travar(cls):
+        """
+        Trava a linha da versão até o fim da transação atual. Serializa as
+        gravações que mexem na posição materializada da fila.
+        """
+        cls.objects.select_for_update().get_or_create(pk=1)
+
+    @classmethod
+    def incrementar(cls):
+        if not cls.objects.filter(pk=1).update(valor=F('valor') + 1):
+            cls.objects.get_or_create(pk=1, defaults={'valor': 1})
+
+
+class ContadorFila(models.Model):
+    """
+    KPIs da fila ativa (os cartões dos dashboards), mantidos na mesma
+    transação de `ListaEsperaCirurgica.save()`/`delete()` e lidos em O(1).
+
+    Saves concorrentes são serializados por `VersaoFila.travar()`; só
+    alterações que não passam por save() (`QuerySet.update()`, cargas em
+    massa) deixam os valores desviados, e `reconciliar_contadores`
+    recalcula e corrige. Enquanto não houver contadores gravados, os
+    dashboards calculam direto na fila.
+    """
+    CHAVES = (
+        'pacientes_na_fila',
+        'especialidades_na_fila',
+        'procedimentos_na_fila',
+        'count_eletivos',
+        'count_oncologicos',
+        'count_judicializados',
+    )
+    # Campos da entrada dos quais os contadores dependem
+    CAMPOS = ('ativo', 'prioridade', 'medida_judicial', 'paciente_id', 'especialidade_id', 'procedimento_id')
+    # Contadores de valores distintos -> campo contado
+    DISTINTOS = {
+        'pacientes_na_fila': 'paciente_id',
+        'especialidades_na_fila': 'especialidade_id',
+        'procedimentos_na_fila': 'procedimento_id',
+    }
+
+    chave = models.CharField(
+        max_length=40,
+        unique=True,
+        verbose_name="Indicador"
+        )
+    valor = models.BigIntegerField(
+        default=0,
+        verbose_name="Valor"
+        )
+
+    class Meta:
+        verbose_name = "Contador da Fila"
+        verbose_name_plural = "Contadores da Fila"
+
+    @classmethod
+    def valores(cls):
+        """{chave: valor} de todos os KPIs, ou None se ainda não foram reconciliados."""
+        valores = dict(cls.objects.values_list('chave', 'valor'))
+        if not all(chave in valores for chave in cls.CHAVES):
+            return None
+        return {chave: valores[chave] for chave in cls.CHAVES}
+
+    @staticmethod
+    def _parcelas(estado):
+        """Quanto uma entrada no `estado` soma em cada contador simples."""
+        if not estado or not estado['ativo']:
+            return {}
+        # Medida judicial nula conta como False, aqui e em `_expressoes_kpis`
+        return {
+            'count_eletivos': int(estado['prioridade'] == 'SEM' and not estado['medida_judicial']),
+            'count_oncologicos': int(estado['prioridade'] == 'ONC'),
+            'count_judicializados': int(bool(estado['medida_judicial'])),
+        }
+
+    @classmethod
+    def registrar_mudanca(cls, pk, anterior, atual):
+        """
+        Aplica aos contadores a passagem da entrada `pk` de `anterior` para
+        `atual` (dicts com CAMPOS; None = não existia/foi apagada). Chamado
+        depois da gravação, dentro da mesma transação.
+        """
+        antes, depois = cls._parcelas(anterior), cls._parcelas(atual)
+        deltas = {chave: depois.get(chave, 0) - antes.get(chave, 0) for chave in {*antes, *depois}}
+
+        for chave, campo in cls.DISTINTOS.items():
+            valor_antigo = anterior[campo] if anterior and anterior['ativo'] else None
+            valor_novo = atual[campo] if atual and atual['ativo'] else None
+            if valor_antigo == valor_novo:
+                continue
+            demais = ListaEsperaCirurgica.objects.filter(ativo=True).exclude(pk=pk)
+            delta = 0
+            # Só conta se era/passou a ser a única entrada ativa daquele valor
+            if valor_antigo is not None and not demais.filter(**{campo: valor_antigo}).exists():
+                delta -= 1
+            if valor_novo is not None and not demais.filter(**{campo: valor_novo}).exists():
+                delta += 1
+            deltas[chave] = delta
+
+        for chave, delta in deltas.items():
+            if delta:
+                cls.objects.filter(chave=chave).update(valor=F('valor') + delta)
+
+
+class SnapshotFila(models.Model):
+    """
+    Ordem da fila ativa em um dia, guardada como um único array de ids
+    (posição = índice no array + 1) em vez de uma linha por entrada.
+    Gerado diariamente por `registrar_snapshot_fila`.
+    """
+    data = models.DateField(
+        unique=True,
+        verbose_name="Data"
+        )
+    ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        verbose_name="Entradas ativas em ordem"
+        )
+
+    class Meta:
+        verbose_name = "Snapshot diário da fila"
+        verbose_name_plural = "Snapshots diários da fila"
+        ordering = ['data']
+
+    def __str__(self):
+        return f"Fila em {self.data:%d/%m/%Y} ({len(self.ids)} entradas)"
+
+    @classmethod
+    def registrar(cls, data=None):
+        """Grava (ou regrava) o snapshot do dia com a ordem atual de `ordered()`."""
+        ids = list(
+            ListaEsperaCirurgica.objects.ordered()
+            .filter(ativo=True)
+            .values_list('id', flat=True)
+        )
+        obj, _ = cls.objects.update_or_create(
+            data=data or localdate(),
+            defaults={'ids': ids},
+        )
+        # A variação de posição exibida na consulta pública depende dos snapshots
+        VersaoFila.incrementar()
+        ConsultaPublica.marcar_pendentes()
+        return obj
+
+    @classmethod
+    def tendencia(cls, ids, dias=28):
+        """
+        Posição diária de cada id nos últimos `dias`, em uma única consulta:
+        {id: [(data, posicao ou None), ...]} do mais antigo ao mais recente.
+
+        No PostgreSQL a posição sai de `array_position` no próprio banco e o
+        array não é trazido para o Python; nos demais bancos, os arrays são
+        lidos e a posição é calculada aqui.
+        """
+        ids = list(ids)
+        if not ids:
+            return {}
+
+        recentes = cls.objects.filter(data__gte=localdate() - timedelta(days=dias))
+        if connections[recentes.db].vendor != 'postgresql':
+            resultado = {obj_id: [] for obj_id in ids}
+            for data, ordem in recentes.values_list('data', 'ids'):
+                posicoes = {obj_id: i for i, obj_id in enumerate(ordem or [], start=1)}
+                for obj_id in ids:
+                    resultado[obj_id].append((data, posicoes.get(obj_id)))
+            return resultado
+
+        colunas = {
+            f'pos_{obj_id}': Func(
+                F('ids'),
+                Cast(obj_id, BigIntegerField()),
+                function='array_position',
+                output_field=IntegerField(),
+            )
+            for obj_id in ids
+        }
+        linhas = recentes.annotate(**colunas).values('data', *colunas)
+        resultado = {obj_id: [] for obj_id in ids}
+        for linha in linhas:
+            for obj_id in ids:
+                resultado[obj_id].append((linha['data'], linha[f'pos_{obj_id}']))
+        return resultado
+
+    @staticmethod
+    def variacao(pontos, posicao_atual):
+        """
+        Quantas posições a entrada avançou desde o ponto mais antigo em que
+        aparece (negativo = recuou). None se não houver histórico.
+        """
+        anteriores = [posicao for _data, posicao in pontos if posicao]
+        if not anteriores or not isinstance(posicao_atual, int):
+            return None
+        return anteriores[0] - posicao_atual
+
+
+class PrevisaoCirurgia(models.Model):
+    """
+    Data estimada de cirurgia de uma entrada ativa, a partir da taxa de
+    saídas com sucesso do procedimento e da posição na sub-fila dele.
+    Recalculada em lote por `prever_datas_cirurgia` (ver previsao.py).
+    """
+    entrada = models.OneToOneField(
+        ListaEsperaCirurgica,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='previsao',
+        verbose_name="Entrada na fila"
+        )
+    data_prevista = models.DateField(
+        null=True, blank=True,
+        verbose_name="Data prevista"
+        )
+    taxa_diaria = models.FloatField(
+        default=0,
+        verbose_name="Cirurgias/dia do procedimento"
+        )
+    calculado_em = models.DateTimeField(
+        verbose_name="Calculado em"
+        )
+
+    class Meta:
+        verbose_name = "Previsão de cirurgia"
+        verbose_name_plural = "Previsões de cirurgia"
+
+    def __str__(self):
+        return f"{self.entrada_id}: {self.data_prevista or 'sem previsão'}"
+
+
+class ConsultaPublica(models.Model):
+    """
+    Resposta pronta da consulta pública de um prontuário: os resumos das
+    entradas ativas/inativas já formatados, com posições e previsões.
+
+    `versao` é a versão da fila em que foi montada. Gravações que mudam a
+    resposta (posições, sub-filas, dados da própria entrada) marcam como
+    `pendente` só as linhas dos prontuários afetados, e o comando
+    `atualizar_consultas_publicas` as remonta (ver cache.py).
+    """
+    prontuario = models.CharField(
+        max_length=20,
+        unique=True,
+        verbose_name="Prontuário"
+        )
+    versao = models.PositiveBigIntegerField(
+        verbose_name="Versão da fila"
+        )
+    entradas_ativas = models.JSONField(
+        default=list,
+        verbose_name="Entradas ativas"
+        )
+    entradas_inativas = models.JSONField(
+        default=list,
+        verbose_name="Entradas inativas"
+        )
+    pendente = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name="Aguardando remontagem"
+        )
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Atualizado em"
+        )
+
+    class Meta:
+        verbose_name = "Consulta pública"
+        verbose_name_plural = "Consultas públicas"
+
+    def __str__(self):
+        return f"{self.prontuario} (versão {self.versao})"
+
+    @classmethod
+    def marcar_pendentes(cls, prontuarios=None):
+        """
+        Marca para remontagem as respostas de `prontuarios` (lista ou
+        subconsulta de prontuários), ou todas, sem `prontuarios`.
+        """
+        linhas = cls.objects.filter(pendente=False)
+        if prontuarios is not None:
+            linhas = linhas.filter(prontuario__in=prontuarios)
+        linhas.update(pendente=True)
+
+
+class ResumoDiarioFila(models.Model):
+    """
+    Totais diários da fila por especialidade × procedimento × prioridade
+    (× medida judicial): entradas e saídas do dia e estoque ativo ao fim
+    do dia. Só há linha nos dias com movimento e, para cada categoria com
+    estoque, no último dia consolidado. Preenchido de forma incremental por
+    `consolidar_indicadores` e lido pelos dashboards (ver indicadores.py).
+    """
+    data = models.DateField(
+        verbose_name="Data"
+        )
+    especialidade = models.ForeignKey(
+        EspecialidadeAghu,
+        on_delete=models.CASCADE,
+        related_name='+'
+        )
+    procedimento = models.ForeignKey(
+        ProcedimentoAghu,
+        on_delete=models.CASCADE,
+        related_name='+'
+        )
+    prioridade = models.CharField(
+        max_length=3,
+        choices=ListaEsperaCirurgica.PRIORIDADE_CHOICES
+        )
+    medida_judicial = models.BooleanField(
+        default=False,
+        verbose_name="Medida Judicial"
+        )
+    entradas = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Entradas no dia"
+        )
+    saidas = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Saídas no dia"
+        )
+    estoque_ativo = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ativos ao fim do dia"
+        )
+
+    class Meta:
+        verbose_name = "Resumo diário da fila"
+        verbose_name_plural = "Resumos diários da fila"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data', 'especialidade', 'procedimento', 'prioridade', 'medida_judicial'],
+                name='resumo_diario_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} · {self.especialidade_id}/{self.procedimento_id}/{self.prioridade}"
 
 
 class IndicadorEspecialidade(ListaEsperaCirurgica):
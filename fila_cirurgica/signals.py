@@ -0,0 +1,14 @@
+# fila_cirurgica/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ListaEsperaCirurgica, VersaoFila
+
+
+@receiver([post_save, post_delete], sender=ListaEsperaCirurgica)
+def incrementar_versao_fila(sender, **kwargs):
+    """
+    Qualquer alteração numa entrada invalida os caches da versão atual. O
+    registro histórico gravado junto não incrementa de novo.
+    """
+    VersaoFila.incrementar()
@@ -0,0 +1,121 @@
+# fila_cirurgica/sintetico.py
+"""
+Geração de dados sintéticos da fila para benchmarks (ver `benchmark_fila`).
+
+Os códigos gerados começam com PREFIXO, para não colidir com cadastros
+reais do AGHU.
+"""
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from .indicadores import reconciliar_contadores
+from .models import (
+    EspecialidadeAghu,
+    ListaEsperaCirurgica,
+    PacienteAghu,
+    ProcedimentoAghu,
+    ProfissionalAghu,
+    VersaoFila,
+)
+
+PREFIXO = "SX"
+
+N_ESPECIALIDADES = 40
+N_PROCEDIMENTOS = 400
+N_PROFISSIONAIS = 150
+PACIENTES_POR_ENTRADA = 0.85
+PERIODO_DIAS = 5 * 365
+
+# Proporções aproximadas da fila real
+PESOS_PRIORIDADE = {"SEM": 80, "BRE": 12, "ONC": 8}
+CHANCE_JUDICIAL = 0.03
+CHANCE_INATIVO = 0.2
+
+
+def _catalogo(model, campo_codigo, largura, total, **extra):
+    """Garante `total` itens sintéticos de um cadastro e retorna seus ids."""
+    model.objects.bulk_create(
+        [
+            model(**{campo_codigo: f"{PREFIXO}{i:0{largura}d}"}, **{k: v.format(i=i) for k, v in extra.items()})
+            for i in range(total)
+        ],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+    return list(
+        model.objects.filter(**{f"{campo_codigo}__startswith": PREFIXO}).values_list("id", flat=True)
+    )
+
+
+def gerar_fila_sintetica(entradas, semente=0):
+    """
+    Acrescenta `entradas` entradas sintéticas na fila (com pacientes,
+    especialidades, procedimentos e médicos sintéticos), reindexa a
+    ordem materializada e reconcilia os contadores de KPI. Retorna o total
+    de entradas na fila.
+    """
+    rnd = random.Random(semente)
+
+    especialidades = _catalogo(
+        EspecialidadeAghu, "cod_especialidade", 4, N_ESPECIALIDADES,
+        nome_especialidade="Especialidade sintética {i}",
+    )
+    procedimentos = _catalogo(
+        ProcedimentoAghu, "codigo", 6, N_PROCEDIMENTOS, nome="Procedimento sintético {i}",
+    )
+    profissionais = _catalogo(
+        ProfissionalAghu, "matricula", 6, N_PROFISSIONAIS, nome="Profissional sintético {i}",
+    )
+    inicio_pacientes = PacienteAghu.objects.filter(prontuario__startswith=PREFIXO).count()
+    novos_pacientes = max(1, int(entradas * PACIENTES_POR_ENTRADA))
+    PacienteAghu.objects.bulk_create(
+        [
+            PacienteAghu(prontuario=f"{PREFIXO}{i:08d}", nome=f"Paciente sintético {i}")
+            for i in range(inicio_pacientes, inicio_pacientes + novos_pacientes)
+        ],
+        batch_size=5000,
+    )
+    pacientes = list(
+        PacienteAghu.objects.filter(prontuario__startswith=PREFIXO).values_list("id", flat=True)
+    )
+
+    prioridades = list(PESOS_PRIORIDADE)
+    pesos = list(PESOS_PRIORIDADE.values())
+    motivos = [codigo for codigo, _ in ListaEsperaCirurgica.MOTIVO_SAIDA_CHOICES]
+    situacoes = [codigo for codigo, _ in ListaEsperaCirurgica.SITUACAO_CHOICES]
+    agora = now()
+
+    objs, datas = [], []
+    for _ in range(entradas):
+        ativo = rnd.random() >= CHANCE_INATIVO
+        obj = ListaEsperaCirurgica(
+            paciente_id=rnd.choice(pacientes),
+            especialidade_id=rnd.choice(especialidades),
+            procedimento_id=rnd.choice(procedimentos),
+            medico_id=rnd.choice(profissionais),
+            prioridade=rnd.choices(prioridades, pesos)[0],
+            medida_judicial=rnd.random() < CHANCE_JUDICIAL,
+            situacao=rnd.choice(situacoes),
+            ativo=ativo,
+            motivo_saida=None if ativo else rnd.choice(motivos),
+        )
+        obj.prioridade_num = obj._prioridade_num()
+        objs.append(obj)
+        datas.append(agora - timedelta(seconds=rnd.randrange(PERIODO_DIAS * 86400)))
+
+    # data_entrada é auto_now_add: o bulk_create grava a hora atual e as
+    # datas sorteadas entram em seguida, com um bulk_update
+    with transaction.atomic():
+        ListaEsperaCirurgica.objects.bulk_create(objs, batch_size=5000)
+        for obj, data_entrada in zip(objs, datas):
+            obj.data_entrada = data_entrada
+        ListaEsperaCirurgica.objects.bulk_update(objs, ["data_entrada"], batch_size=5000)
+
+    # bulk_create não passa por save(): posições e contadores são refeitos aqui
+    ListaEsperaCirurgica.objects.reindexar_posicoes()
+    reconciliar_contadores()
+    VersaoFila.incrementar()
+    return ListaEsperaCirurgica.objects.count()
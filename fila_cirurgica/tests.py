@@ -1,3 +1,395 @@
+import json
+import random
+from io import StringIO
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import localdate, now
+
+from . import aghu, catalogos
+from .api_helpers import resolver_em_lote
+from .cache import atualizar_consultas_publicas, consulta_publica
+from .indicadores import _expressoes_kpis, consolidar_resumos, kpis_fila, reconciliar_contadores
+
+from .models import (
+    ConsultaPublica,
+    ContadorFila,
+    EspecialidadeAghu,
+    ListaEsperaCirurgica,
+    PacienteAghu,
+    ProcedimentoAghu,
+    ResumoDiarioFila,
+    VersaoFila,
+)
+
+
+class FilaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidade = EspecialidadeAghu.objects.create(cod_especialidade="1", nome_especialidade="Cirurgia Geral")
+        cls.procedimento = ProcedimentoAghu.objects.create(codigo="0407", nome="Colecistectomia")
+        cls.pacientes = [
+            PacienteAghu.objects.create(prontuario=str(i), nome=f"Paciente {i}") for i in range(10)
+        ]
+
+    def criar_entrada(self, paciente, **campos):
+        return ListaEsperaCirurgica.objects.create(
+            paciente=paciente,
+            especialidade=self.especialidade,
+            procedimento=self.procedimento,
+            **campos,
+        )
+
+
+class PosicaoMaterializadaTests(FilaTestCase):
+    def assertPosicoesContinuas(self):
+        ativos = list(ListaEsperaCirurgica.objects.ordered().filter(ativo=True).values_list("id", "posicao"))
+        self.assertEqual([posicao for _, posicao in ativos], list(range(1, len(ativos) + 1)), ativos)
+        self.assertFalse(ListaEsperaCirurgica.objects.filter(ativo=False, posicao__isnull=False).exists())
+
+    def test_posicoes_continuas_apos_operacoes_mistas(self):
+        rnd = random.Random(21)
+        for _ in range(15):
+            self.criar_entrada(rnd.choice(self.pacientes), prioridade=rnd.choice(["SEM", "BRE", "ONC"]))
+
+        for passo in range(80):
+            entradas = list(ListaEsperaCirurgica.objects.all())
+            entrada = rnd.choice(entradas)
+            operacao = rnd.random()
+            if operacao < 0.2:
+                self.criar_entrada(rnd.choice(self.pacientes), prioridade=rnd.choice(["SEM", "BRE", "ONC"]))
+            elif operacao < 0.4:
+                entrada.delete()
+            elif operacao < 0.6:
+                entrada.ativo = not entrada.ativo
+                entrada.save()
+            elif operacao < 0.8:
+                entrada.prioridade = rnd.choice(["SEM", "BRE", "ONC"])
+                entrada.save()
+            else:
+                entrada.medida_judicial = not entrada.medida_judicial
+                entrada.save()
+            with self.subTest(passo=passo):
+                self.assertPosicoesContinuas()
+
+    def test_delete_de_entrada_ativa_sobe_quem_estava_atras(self):
+        entradas = [self.criar_entrada(paciente) for paciente in self.pacientes[:4]]
+        entradas[1].delete()
+        self.assertPosicoesContinuas()
+        entradas[3].refresh_from_db()
+        self.assertEqual(entradas[3].posicao, 3)
+
+
+class ConsolidarResumosTests(FilaTestCase):
+    def estoque_de_hoje(self):
+        return dict(
+            ResumoDiarioFila.objects.filter(data=localdate())
+            .values_list("prioridade", "estoque_ativo")
+        )
+
+    def test_estoque_acompanha_repriorizacao_e_reativacao(self):
+        entradas = [self.criar_entrada(paciente, prioridade="SEM") for paciente in self.pacientes[:3]]
+        consolidar_resumos()
+        self.assertEqual(self.estoque_de_hoje(), {"SEM": 3})
+
+        entradas[0].prioridade = "ONC"
+        entradas[0].save()
+        entradas[1].ativo = False
+        entradas[1].save()
+        consolidar_resumos()
+        self.assertEqual(self.estoque_de_hoje(), {"SEM": 1, "ONC": 1})
+
+        entradas[1].ativo = True
+        entradas[1].save()
+        consolidar_resumos()
+        self.assertEqual(self.estoque_de_hoje(), {"SEM": 2, "ONC": 1})
+
+
+class ContadorFilaTests(FilaTestCase):
+    def test_medida_judicial_nula_conta_igual_nos_contadores_e_na_fila(self):
+        self.criar_entrada(self.pacientes[0], prioridade="SEM", medida_judicial=None)
+        self.criar_entrada(self.pacientes[1], prioridade="SEM", medida_judicial=False)
+        self.criar_entrada(self.pacientes[2], prioridade="SEM", medida_judicial=True)
+
+        esperado = ListaEsperaCirurgica.objects.aggregate(**_expressoes_kpis())
+        self.assertEqual(esperado["count_eletivos"], 2)
+        self.assertEqual(esperado["count_judicializados"], 1)
+        reconciliar_contadores()
+        self.assertEqual(ContadorFila.valores(), esperado)
+
+        # Contadores mantidos pelos saves seguintes batem com a fila
+        entrada = ListaEsperaCirurgica.objects.get(medida_judicial__isnull=True)
+        entrada.medida_judicial = True
+        entrada.save()
+        self.assertEqual(reconciliar_contadores(), {})
+        self.assertEqual(ContadorFila.valores()["count_eletivos"], 1)
+
+    def assertContadoresBatemComAFila(self):
+        self.assertEqual(kpis_fila(), ListaEsperaCirurgica.objects.aggregate(**_expressoes_kpis()))
+        self.assertEqual(reconciliar_contadores(), {})
+
+    def test_contadores_acompanham_criacao_alteracao_e_exclusao(self):
+        reconciliar_contadores()
+        outra = EspecialidadeAghu.objects.create(cod_especialidade="2", nome_especialidade="Urologia")
+        entradas = [
+            self.criar_entrada(self.pacientes[0], prioridade="ONC"),
+            self.criar_entrada(self.pacientes[0], prioridade="SEM"),
+            self.criar_entrada(self.pacientes[1], prioridade="BRE", medida_judicial=True),
+            self.criar_entrada(self.pacientes[2], prioridade="SEM"),
+        ]
+        self.assertContadoresBatemComAFila()
+        self.assertEqual(kpis_fila()["pacientes_na_fila"], 3)
+
+        entradas[0].prioridade = "SEM"
+        entradas[0].save()
+        entradas[3].especialidade = outra
+        entradas[3].save()
+        self.assertContadoresBatemComAFila()
+        self.assertEqual(kpis_fila()["especialidades_na_fila"], 2)
+
+        entradas[2].ativo = False
+        entradas[2].save()
+        self.assertContadoresBatemComAFila()
+
+        entradas[1].delete()
+        entradas[3].delete()
+        self.assertContadoresBatemComAFila()
+        self.assertEqual(kpis_fila()["pacientes_na_fila"], 1)
+
+
+class ConsultaPublicaTests(FilaTestCase):
+    def test_um_incremento_de_versao_por_gravacao(self):
+        versao = VersaoFila.atual()
+        entrada = self.criar_entrada(self.pacientes[0])
+        entrada.prioridade = "ONC"
+        entrada.save()
+        self.assertEqual(VersaoFila.atual(), versao + 2)
+
+    def pendentes(self):
+        return set(ConsultaPublica.objects.filter(pendente=True).values_list("prontuario", flat=True))
+
+    def test_consulta_so_le_e_o_comando_remonta(self):
+        prontuario = self.pacientes[0].prontuario
+        self.criar_entrada(self.pacientes[0])
+        self.assertEqual(consulta_publica(prontuario)["entradas_ativas"][0]["posicao"], 1)
+
+        self.criar_entrada(self.pacientes[1], prioridade="ONC")
+        self.assertEqual(self.pendentes(), {prontuario})
+
+        # A consulta não remonta nem grava: serve a linha como está
+        with self.assertNumQueries(1):
+            dados = consulta_publica(prontuario)
+        self.assertEqual(dados["entradas_ativas"][0]["posicao"], 1)
+
+        call_command("atualizar_consultas_publicas", stdout=StringIO())
+        self.assertEqual(self.pendentes(), set())
+        self.assertEqual(consulta_publica(prontuario)["entradas_ativas"][0]["posicao"], 2)
+
+    def test_marca_so_os_prontuarios_afetados(self):
+        entradas = [self.criar_entrada(paciente) for paciente in self.pacientes[:4]]
+        for paciente in self.pacientes[:4]:
+            consulta_publica(paciente.prontuario)
+
+        # Campo que não muda a ordem: só a resposta do próprio paciente
+        entradas[1].observacoes = "Exames pendentes"
+        entradas[1].save()
+        self.assertEqual(self.pendentes(), {"1"})
+        atualizar_consultas_publicas()
+
+        # Quem passa à frente afeta ele mesmo e quem fica atrás
+        entradas[2].prioridade = "ONC"
+        entradas[2].save()
+        self.assertEqual(self.pendentes(), {"0", "1", "2"})
+        atualizar_consultas_publicas()
+
+        # Saída da fila: o próprio paciente e quem estava atrás
+        entradas[1].delete()
+        self.assertEqual(self.pendentes(), {"1", "3"})
+        self.assertEqual(atualizar_consultas_publicas(), 1)
+        self.assertFalse(ConsultaPublica.objects.filter(prontuario="1").exists())
+        self.assertEqual(consulta_publica("3")["entradas_ativas"][0]["posicao"], 3)
+
+
+class AdminFilaTests(FilaTestCase):
+    def test_admin_nao_deleta_entradas(self):
+        entrada = self.criar_entrada(self.pacientes[0])
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "senha"))
+        self.client.post(
+            reverse("admin:fila_cirurgica_listaesperacirurgica_changelist"),
+            {"action": "delete_selected", "_selected_action": [entrada.pk], "post": "yes"},
+        )
+        self.assertTrue(ListaEsperaCirurgica.objects.filter(pk=entrada.pk).exists())
+        self.assertFalse(admin.site._registry[ListaEsperaCirurgica].has_delete_permission(None, entrada))
+
+
+def resposta_http(status, dados=None):
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta.url = f"{settings.API_BASE_URL}/teste"
+    resposta._content = b"" if dados is None else json.dumps(dados).encode()
+    return resposta
+
+
+class DisjuntorTests(TestCase):
+    def setUp(self):
+        self.relogio = 1000.0
+        relogio = mock.patch("fila_cirurgica.aghu.time.monotonic", side_effect=lambda: self.relogio)
+        relogio.start()
+        self.addCleanup(relogio.stop)
+
+    def test_abre_testa_uma_vez_e_fecha(self):
+        disjuntor = aghu.Disjuntor(falhas_para_abrir=3, espera=30)
+        disjuntor.falha()
+        disjuntor.falha()
+        self.assertEqual(disjuntor.estado, "fechado")
+        self.assertTrue(disjuntor.permitir())
+
+        disjuntor.falha()
+        self.assertEqual(disjuntor.estado, "aberto")
+        self.assertFalse(disjuntor.permitir())
+
+        self.relogio += 30
+        self.assertEqual(disjuntor.estado, "meio-aberto")
+        # Uma só chamada de teste por vez
+        self.assertTrue(disjuntor.permitir())
+        self.assertFalse(disjuntor.permitir())
+
+        # Teste falhou: abre de novo por mais uma espera inteira
+        disjuntor.falha()
+        self.assertEqual(disjuntor.estado, "aberto")
+        self.relogio += 29
+        self.assertFalse(disjuntor.permitir())
+
+        self.relogio += 1
+        self.assertTrue(disjuntor.permitir())
+        disjuntor.sucesso()
+        self.assertEqual(disjuntor.estado, "fechado")
+        self.assertTrue(disjuntor.permitir())
+        self.assertTrue(disjuntor.permitir())
+
+    def test_get_json_conta_so_falhas_de_disponibilidade(self):
+        disjuntor = aghu.Disjuntor(falhas_para_abrir=2, espera=30)
+        with mock.patch.object(aghu, "disjuntor", disjuntor), mock.patch.object(aghu._sessao, "get") as get:
+            get.return_value = resposta_http(404)
+            for _ in range(5):
+                with self.assertRaises(requests.HTTPError):
+                    aghu.get_json("pacientes/1")
+            self.assertEqual(disjuntor.estado, "fechado")
+
+            get.return_value = resposta_http(503)
+            for _ in range(2):
+                with self.assertRaises(requests.HTTPError):
+                    aghu.get_json("pacientes/1")
+            self.assertEqual(disjuntor.estado, "aberto")
+
+            get.reset_mock()
+            with self.assertRaises(aghu.AghuIndisponivel):
+                aghu.get_json("pacientes/1")
+            get.assert_not_called()
+
+    def test_cache_serve_resposta_vencida_com_disjuntor_aberto(self):
+        caches["aghu"].clear()
+        self.addCleanup(caches["aghu"].clear)
+        disjuntor = aghu.Disjuntor(falhas_para_abrir=1, espera=30)
+        with (
+            mock.patch.object(aghu, "disjuntor", disjuntor),
+            mock.patch.object(aghu, "executor") as executor,
+            mock.patch.object(aghu._sessao, "get", return_value=resposta_http(200, [{"codigo": "1"}])) as get,
+        ):
+            self.assertEqual(aghu.get_json_em_cache("especialidades", {"term": "cir"}), [{"codigo": "1"}])
+            get.reset_mock()
+            disjuntor.falha()
+
+            vencido = aghu.time.time() + aghu.CACHE_TTLS["especialidades"] + 1
+            with mock.patch("fila_cirurgica.aghu.time.time", return_value=vencido):
+                self.assertEqual(aghu.get_json_em_cache("especialidades", {"term": "cir"}), [{"codigo": "1"}])
+                # Uma só atualização em segundo plano, recusada pelo disjuntor
+                self.assertEqual(aghu.get_json_em_cache("especialidades", {"term": "cir"}), [{"codigo": "1"}])
+                executor.submit.assert_called_once()
+                atualizar, *argumentos = executor.submit.call_args.args
+                with self.assertRaises(aghu.AghuIndisponivel):
+                    atualizar(*argumentos)
+                get.assert_not_called()
+                self.assertEqual(aghu.get_json_em_cache("especialidades", {"term": "cir"}), [{"codigo": "1"}])
+
+
+class ResolverEmLoteTests(TestCase):
+    def buscar(self, tipo, codigo):
+        """AGHU simulado: só conhece "007" (devolvido como "7") e "12"; "3" e "5" estão fora do ar."""
+        self.assertEqual(tipo, "especialidade")
+        if codigo in ("3", "5"):
+            raise requests.ConnectionError("AGHU fora do ar")
+        conhecidos = {"007": ("7", "Ortopedia"), "12": ("12", "Urologia")}
+        if codigo not in conhecidos:
+            raise requests.HTTPError(response=resposta_http(404))
+        cod, nome = conhecidos[codigo]
+        return {"COD_ESPECIALIDADE": cod, "NOME_ESPECIALIDADE": nome}
+
+    def resolver(self, codigos):
+        with (
+            mock.patch("fila_cirurgica.api_helpers._buscar", side_effect=self.buscar) as buscar,
+            mock.patch("fila_cirurgica.api_helpers._agendar_atualizacao") as agendar,
+            self.assertLogs("fila_cirurgica.api_helpers", "WARNING") as logs,
+        ):
+            resultado = resolver_em_lote("especialidade", codigos)
+        return resultado, buscar, agendar, "\n".join(logs.output)
+
+    def test_resultado_pelo_codigo_pedido(self):
+        EspecialidadeAghu.objects.create(cod_especialidade="12", nome_especialidade="Nome antigo")
+        resultado, buscar, agendar, logs = self.resolver(["007", " 007 ", "12", "99", "", None])
+
+        self.assertEqual(buscar.call_count, 3)
+        self.assertEqual(set(resultado), {"007", "12"})
+        self.assertEqual(resultado["007"].cod_especialidade, "7")
+        self.assertEqual(resultado["007"].nome_busca, "ortopedia")
+        self.assertEqual(resultado["12"].nome_especialidade, "Urologia")
+        self.assertFalse(EspecialidadeAghu.objects.filter(cod_especialidade="007").exists())
+        agendar.assert_not_called()
+        self.assertIn("1 especialidade(s) não resolvido(s): 99", logs)
+
+    def test_copia_local_com_aghu_fora_do_ar(self):
+        local = EspecialidadeAghu.objects.create(cod_especialidade="3", nome_especialidade="Cardiologia")
+        resultado, _, agendar, logs = self.resolver(["3", "5", "12"])
+
+        self.assertEqual(resultado["3"], local)
+        self.assertEqual(resultado["12"].cod_especialidade, "12")
+        # Sem cópia local, o código fica de fora
+        self.assertNotIn("5", resultado)
+        agendar.assert_called_once_with("especialidade", "3")
+        self.assertIn("usando a cópia local de 1 especialidade(s)", logs)
+        self.assertIn("não resolvido(s): 5", logs)
+
+
+class CatalogoSincronizadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_resposta_em_cache_com_validade(self):
+        EspecialidadeAghu.objects.create(cod_especialidade="1", nome_especialidade="Cirurgia Geral")
+        self.assertFalse(catalogos.sincronizado("especialidades"))
+
+        EspecialidadeAghu.objects.update(atualizado_em=now())
+        with self.assertNumQueries(0):
+            self.assertFalse(catalogos.sincronizado("especialidades"))
+
+        # Vencida a validade, volta a consultar o banco
+        cache.delete(catalogos._chave_sincronizado("especialidades"))
+        self.assertTrue(catalogos.sincronizado("especialidades"))
+        EspecialidadeAghu.objects.all().delete()
+        cache.delete(catalogos._chave_sincronizado("especialidades"))
+        self.assertFalse(catalogos.sincronizado("especialidades"))
+
 
-# Create your tests here.
+class PreverDatasCirurgiaTests(TestCase):
+    def test_janela_menor_que_um_dia_e_recusada(self):
+        for janela in ("0", "-5"):
+            with self.subTest(janela=janela), self.assertRaisesMessage(CommandError, "--janela"):
+                call_command("prever_datas_cirurgia", "--janela", janela, stdout=StringIO())
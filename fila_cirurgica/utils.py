@@ -1,10 +1,15 @@
 # fila_cirurgica/utils.py
+import logging
+
 import requests
 from django.http import JsonResponse
-from django.conf import settings
+
+from . import aghu, catalogos
+
+logger = logging.getLogger(__name__)
 
 def api_autocomplete_proxy(request, api_endpoint, id_field, text_format_str):
-    term = request.GET.get('term', '')
+    term = request.GET.get('term', '').strip()
     page = request.GET.get('page')
     limit = request.GET.get('limit', 25)
     params = {'term': term, 'limit': 25}
@@ -14,9 +19,7 @@ def api_autocomplete_proxy(request, api_endpoint, id_field, text_format_str):
         params['limit'] = limit
 
     try:
-        response = requests.get(f"{settings.API_BASE_URL}/{api_endpoint}/", params=params)
-        response.raise_for_status()
-        api_data = response.json()
+        api_data = aghu.get_json_em_cache(f"{api_endpoint}/", params=params)
 
         results = [
             {"id": str(item[id_field]), "text": text_format_str.format(**item)}
@@ -24,11 +27,49 @@ def api_autocomplete_proxy(request, api_endpoint, id_field, text_format_str):
         ]
         more = str(len(results)) == params.get('limit', 25)
         return JsonResponse({"results": results, "pagination": {"more": more}})
-    except requests.RequestException:
-        print("api_autocomplete_proxy: erro ao chamar API")
+    except requests.RequestException as e:
+        logger.warning("Autocomplete %s: falha ao chamar a API do AGHU: %s", api_endpoint, e)
         return JsonResponse({'error': 'Falha ao contatar a API'}, status=500)
     
 
+def _inteiro(valor, padrao, maximo):
+    try:
+        return min(max(int(valor), 1), maximo)
+    except (TypeError, ValueError):
+        return padrao
+
+
+def autocomplete_catalogo(request, catalogo, limit=25, filtros=None):
+    """
+    Autocomplete servido da cópia local do catálogo (ver
+    `catalogos.sincronizar_catalogo`), no formato do proxy da API. Atende
+    ?term, ?page, ?limit e o pré-carregamento por ?id; `filtros` restringe
+    a busca (ex.: procedimentos da especialidade escolhida).
+
+    Retorna None quando a cópia local não tem o que responder (catálogo
+    nunca sincronizado ou ?id ausente dela); a view então cai no proxy.
+    Uma busca sem resultado no catálogo sincronizado fica sem resultado.
+    """
+    requested_id = request.GET.get('id')
+    if requested_id:
+        encontrado = catalogos.item(catalogo, requested_id)
+        if encontrado is None:
+            return None
+        return JsonResponse({"results": [encontrado], "pagination": {"more": False}})
+
+    if not catalogos.sincronizado(catalogo):
+        return None
+    pagina = _inteiro(request.GET.get('page'), 1, 10**6)
+    dados = catalogos.buscar(
+        catalogo,
+        request.GET.get('term', ''),
+        pagina=pagina,
+        limite=_inteiro(request.GET.get('limit'), limit, 100),
+        filtros=filtros,
+    )
+    return JsonResponse(dados)
+
+
 # adicionar em fila_cirurgica/utils.py (abaixo da api_autocomplete_proxy existente)
 
 def api_autocomplete_procedimento(request,
@@ -37,7 +78,7 @@ def api_autocomplete_procedimento(request,
                                   text_format_str='{COD_PROCEDIMENTO} - {PROCEDIMENTO}',
                                   especialidade_param='cod_especialidade',
                                   limit=5,
-                                  timeout=10):
+                                  timeout=None):
     """
     Proxy autocomplete específico para PROCEDIMENTOS que:
       - aceita ?term=... & page=...
@@ -49,9 +90,7 @@ def api_autocomplete_procedimento(request,
     requested_id = request.GET.get('id')
     if requested_id:
         try:
-            resp = requests.get(f"{settings.API_BASE_URL}/{api_endpoint}/{requested_id}/", timeout=timeout)
-            resp.raise_for_status()
-            item = resp.json()
+            item = aghu.get_json_em_cache(f"{api_endpoint}/{requested_id}/", timeout=timeout)
             # aceita resposta objeto ou lista
             if isinstance(item, list):
                 item = item[0] if item else None
@@ -67,7 +106,7 @@ def api_autocomplete_procedimento(request,
             return JsonResponse({'error': 'Falha ao contatar a API'}, status=500)
 
     # --- caso busca/paginação normal ---
-    term = request.GET.get('term', '')
+    term = request.GET.get('term', '').strip()
     page = request.GET.get('page')
     params = {'term': term, 'limit': limit}
     if page:
@@ -79,9 +118,7 @@ def api_autocomplete_procedimento(request,
         params[especialidade_param] = especialidade_val
 
     try:
-        response = requests.get(f"{settings.API_BASE_URL}/{api_endpoint}/", params=params, timeout=timeout)
-        response.raise_for_status()
-        api_data = response.json()
+        api_data = aghu.get_json_em_cache(f"{api_endpoint}/", params=params, timeout=timeout)
         # se a API devolve wrapper { results: [...] }, normalize
         if isinstance(api_data, dict) and 'results' in api_data:
             items = api_data['results']
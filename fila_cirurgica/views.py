@@ -1,14 +1,33 @@
 # fila_cirurgica/views.py
-from .utils import api_autocomplete_proxy, api_autocomplete_procedimento
+from . import catalogos
+from .utils import api_autocomplete_proxy, api_autocomplete_procedimento, autocomplete_catalogo
+
+# Especialidades, procedimentos e profissionais saem da cópia local dos
+# catálogos (comando sincronizar_catalogos); a API só é chamada para o que
+# ainda não foi sincronizado. Pacientes continuam vindo do AGHU.
 
 def procedimento_api_autocomplete(request):
-    return api_autocomplete_procedimento(request)
+    especialidade_id = request.GET.get('especialidade_id')
+    if especialidade_id and not catalogos.especialidade_com_procedimentos(especialidade_id):
+        # Relação desta especialidade ainda não carregada: o AGHU filtra
+        return api_autocomplete_procedimento(request)
+    filtros = {'especialidades__cod_especialidade': especialidade_id} if especialidade_id else None
+    return (
+        autocomplete_catalogo(request, 'procedimentos', limit=5, filtros=filtros)
+        or api_autocomplete_procedimento(request)
+    )
 
 def paciente_api_autocomplete(request):
     return api_autocomplete_proxy(request, 'pacientes', 'PRONTUARIO_PAC', '{NOME_PACIENTE} (Prontuário: {PRONTUARIO_PAC})')
 
 def medico_api_autocomplete(request):
-    return api_autocomplete_proxy(request, 'profissionais', 'MATRICULA', '{NOME_PROFISSIONAL} (Matrícula: {MATRICULA})')
+    return (
+        autocomplete_catalogo(request, 'profissionais')
+        or api_autocomplete_proxy(request, 'profissionais', 'MATRICULA', '{NOME_PROFISSIONAL} (Matrícula: {MATRICULA})')
+    )
 
 def especialidade_api_autocomplete(request):
-    return api_autocomplete_proxy(request, 'especialidades', 'COD_ESPECIALIDADE', '{NOME_ESPECIALIDADE}')
+    return (
+        autocomplete_catalogo(request, 'especialidades')
+        or api_autocomplete_proxy(request, 'especialidades', 'COD_ESPECIALIDADE', '{NOME_ESPECIALIDADE}')
+    )
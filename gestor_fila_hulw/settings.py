@@ -19,6 +19,8 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 API_BASE_URL = "http://127.0.0.1:8000/api/v1"
+# Conexões keep-alive mantidas com a API do AGHU por processo (fila_cirurgica/aghu.py)
+AGHU_POOL_CONEXOES = 10
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -118,6 +120,32 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# As chaves derivadas da fila levam a versão guardada em VersaoFila (banco),
+# então um backend local por processo não serve dados desatualizados.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gestor-fila-hulw',
+    },
+    # Respostas da API do AGHU para o autocomplete (fila_cirurgica/aghu.py).
+    # O LocMemCache remove as entradas menos usadas recentemente; com
+    # CULL_FREQUENCY == MAX_ENTRIES, uma de cada vez.
+    'aghu': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gestor-fila-hulw-aghu',
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 5000},
+    },
+}
+
+# Atualização ao vivo do dashboard (server-sent events, requer ASGI):
+# conexões simultâneas por processo e segundos entre as verificações de
+# alteração da fila.
+SSE_MAX_CONEXOES = 50
+SSE_INTERVALO = 2
+
 LOGIN_URL = "portal:login"
 LOGIN_REDIRECT_URL = "portal:dashboard"
 LOGOUT_REDIRECT_URL = "portal:login"
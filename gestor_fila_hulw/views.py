@@ -1,5 +1,6 @@
 from django.shortcuts import render, redirect
 from fila_cirurgica.models import PacienteAghu, ProcedimentoAghu, EspecialidadeAghu
+from fila_cirurgica.catalogos import carregar_especialidades_procedimentos
 import re
 from bs4 import BeautifulSoup
 from django.core.files.storage import default_storage
@@ -155,6 +156,10 @@ def processar_csv_especialidades(request):
     return render(request, 'upload.html')
 
 
+# Cabeçalho exigido no CSV de especialidades e procedimentos
+COLUNAS_ESPECIALIDADES_PROCEDIMENTOS = ("cod_especialidade", "especialidade", "cod_procedimento", "nome_procedimento")
+
+
 def processar_csv_especialidades_procedimentos(request):
     if request.method == "POST":
         arquivo = request.FILES.get("file_especialidade_procedimento")
@@ -167,22 +172,29 @@ def processar_csv_especialidades_procedimentos(request):
 
         with open(default_storage.path(file_path), newline='', encoding="utf-8-sig") as csvfile:
             leitor = csv.DictReader(csvfile, delimiter=";")
-
-            for linha in leitor:
-                cod_especialidade = linha.get("cod_especialidade", "").strip()
-                nome_especialidade = linha.get("especialidade", "").strip()
-                cod_procedimento = linha.get("cod_procedimento", "").strip()
-                nome_procedimento = linha.get("nome_procedimento", "").strip()
-                situacao_procedimento = linha.get(
-                    "situacao_procedimento", "").strip()
-
-                if cod_especialidade and nome_especialidade and cod_procedimento and nome_procedimento:
-                    especialidade, _ = EspecialidadeAghu.objects.get_or_create(
-                        cod_especialidade=cod_especialidade, nome_especialidade=nome_especialidade
-                    )
-                    procedimento, _ = ProcedimentoAghu.objects.get_or_create(
-                        codigo=cod_procedimento, nome=nome_procedimento
-                    )
+            faltando = set(COLUNAS_ESPECIALIDADES_PROCEDIMENTOS) - set(leitor.fieldnames or ())
+            if faltando:
+                messages.error(
+                    request, f"Colunas ausentes no arquivo: {', '.join(sorted(faltando))}.")
+                return redirect("importar_especialidades_procedimentos")
+
+            # Cada especialidade do arquivo tem seus procedimentos
+            # substituídos (ver `carregar_especialidades_procedimentos`)
+            pares = [
+                par
+                for par in (
+                    tuple((linha[coluna] or "").strip() for coluna in COLUNAS_ESPECIALIDADES_PROCEDIMENTOS)
+                    for linha in leitor
+                )
+                if all(par)
+            ]
+
+        try:
+            carregar_especialidades_procedimentos(pares)
+        except ValueError:
+            messages.error(
+                request, "Nenhuma linha válida no arquivo; a relação existente foi mantida.")
+            return redirect("importar_especialidades_procedimentos")
 
         messages.success(
             request, "Especialidades e Procedimentos importados com sucesso!")
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import csv
+import re
+import zipfile
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Linhas acumuladas antes de cada envio ao cliente
+LINHAS_POR_ENVIO = 500
+
+
+def resposta_exportacao(nome_arquivo, formato, cabecalho, linhas):
+    """
+    StreamingHttpResponse com `linhas` (um iterável, de preferência um
+    `.iterator()` de `values_list`) em CSV ou XLSX. Nada é montado em
+    memória: os bytes saem à medida que as linhas são lidas do banco.
+    """
+    if formato not in FORMATOS:
+        formato = "csv"
+    gerador = linhas_xlsx if formato == "xlsx" else linhas_csv
+    response = StreamingHttpResponse(gerador(cabecalho, linhas), content_type=FORMATOS[formato])
+    response["Content-Disposition"] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return response
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(cabecalho, linhas):
+    """CSV separado por ";" com BOM, como os arquivos importados pelo sistema (abre direto no Excel)."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+    yield "\ufeff" + escritor.writerow(cabecalho)
+    lote = []
+    for linha in linhas:
+        lote.append(escritor.writerow(linha))
+        if len(lote) >= LINHAS_POR_ENVIO:
+            yield "".join(lote)
+            lote.clear()
+    if lote:
+        yield "".join(lote)
+
+
+class _BufferZip:
+    """
+    Destino não posicionável para o ZipFile: o zipfile grava descritores de
+    dados em vez de voltar no arquivo, e o conteúdo é retirado aos pedaços.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+_NS = "http://schemas.openxmlformats.org/"
+_PARTES_XLSX = {
+    "[Content_Types].xml": (
+        f'<Types xmlns="{_NS}package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{_NS}package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_NS}officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        f'<workbook xmlns="{_NS}spreadsheetml/2006/main" xmlns:r="{_NS}officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        f'<Relationships xmlns="{_NS}package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_NS}officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+# Caracteres de controle não são permitidos em XML
+_CONTROLE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _celula(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_CONTROLE.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def linhas_xlsx(cabecalho, linhas):
+    """
+    Planilha XLSX mínima (uma aba, textos inline) gerada aos pedaços com
+    zipfile, sem biblioteca externa e sem arquivo temporário.
+    """
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _PARTES_XLSX.items():
+            pacote.writestr(nome, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>' + conteudo)
+        with pacote.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as folha:
+            folha.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<worksheet xmlns="{_NS}spreadsheetml/2006/main"><sheetData>'.encode()
+            )
+            for i, linha in enumerate(chain([cabecalho], linhas), start=1):
+                folha.write(f"<row>{''.join(_celula(v) for v in linha)}</row>".encode())
+                if i % LINHAS_POR_ENVIO == 0:
+                    yield buffer.esvaziar()
+            folha.write(b"</sheetData></worksheet>")
+    yield buffer.esvaziar()
@@ -2,12 +2,7 @@ from __future__ import annotations
 
 from django import forms
 from django.urls import reverse_lazy  # Importado para resolver URLs no widget
-from fila_cirurgica.api_helpers import (
-    get_or_create_especialidade,
-    get_or_create_paciente,
-    get_or_create_procedimento,
-    get_or_create_profissional,
-)
+from fila_cirurgica.api_helpers import resolver_entidades
 from fila_cirurgica.models import ListaEsperaCirurgica
 from aih.models import AihSolicitacao
 
@@ -438,20 +433,24 @@ class FilaCreateForm(forms.ModelForm):
         proc_sec_id = self.cleaned_data.get("procedimento_secundario_api")
         esp_sec_id = self.cleaned_data.get("especialidade_secundario_api")
 
-        # 2. Usa os 'helpers' para buscar ou criar os objetos FK
-        # (Isso desacopla o form da lógica de API)
-        instance.paciente = get_or_create_paciente(prontuario=prontuario)
-        instance.especialidade = get_or_create_especialidade(esp_id)
-        instance.procedimento = get_or_create_procedimento(proc_id)
-        instance.medico = get_or_create_profissional(med_id)
-
-        # 3. Processa os campos secundários (opcionais)
-        if proc_sec_id and esp_sec_id:
-            instance.procedimento_secundario = get_or_create_procedimento(proc_sec_id)
-            instance.especialidade_secundario = get_or_create_especialidade(esp_sec_id)
-        else:
-            instance.procedimento_secundario = None
-            instance.especialidade_secundario = None
+        # Os secundários (opcionais) só valem em par
+        if not (proc_sec_id and esp_sec_id):
+            proc_sec_id = esp_sec_id = None
+
+        # 2. Usa os 'helpers' para buscar ou criar os objetos FK, com as
+        # chamadas à API em paralelo (isso desacopla o form da lógica de API)
+        objetos = resolver_entidades(
+            paciente=("paciente", prontuario),
+            especialidade=("especialidade", esp_id),
+            procedimento=("procedimento", proc_id),
+            medico=("profissional", med_id),
+            procedimento_secundario=("procedimento", proc_sec_id),
+            especialidade_secundario=("especialidade", esp_sec_id),
+        )
+
+        # 3. Preenche os FKs (secundários ficam None se não enviados)
+        for campo, obj in objetos.items():
+            setattr(instance, campo, obj)
 
         # 4. Salva a instância no banco (se commit=True)
         if commit:
@@ -669,12 +668,18 @@ class AihCreateForm(forms.ModelForm):
         proc_id = str(self.cleaned_data["procedimento_api"])
         med_id = str(self.cleaned_data["medico_api"])
 
-        # Usa os helpers para buscar/criar os objetos relacionados
-        # Assumindo que os helpers retornam o objeto ou None se não encontrado/criado
-        paciente_obj = get_or_create_paciente(prontuario=prontuario_str)
-        especialidade_obj = get_or_create_especialidade(esp_id)
-        procedimento_obj = get_or_create_procedimento(proc_id)
-        medico_obj = get_or_create_profissional(med_id)
+        # Usa os helpers para buscar/criar os objetos relacionados (chamadas
+        # à API em paralelo); cada objeto é None se o ID veio vazio
+        objetos = resolver_entidades(
+            paciente=("paciente", prontuario_str),
+            especialidade=("especialidade", esp_id),
+            procedimento=("procedimento", proc_id),
+            medico=("profissional", med_id),
+        )
+        paciente_obj = objetos["paciente"]
+        especialidade_obj = objetos["especialidade"]
+        procedimento_obj = objetos["procedimento"]
+        medico_obj = objetos["medico"]
 
         # --- PREENCHIMENTO DOS CAMPOS ---
 
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+
+
+class PaginaCursor:
+    """
+    Página da fila paginada por cursor (keyset) em vez de OFFSET.
+
+    Cada página guarda a chave da primeira e da última entrada; os links de
+    anterior/próxima levam essas chaves e a consulta parte direto delas, então
+    a página 1 e a página 1000 custam o mesmo. O total é estimado.
+    """
+
+    def __init__(self, objetos, tem_anterior, tem_proxima, total_estimado):
+        self.object_list = objetos
+        self.tem_anterior = tem_anterior
+        self.tem_proxima = tem_proxima
+        self.total_estimado = total_estimado
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def cursor_anterior(self):
+        if not (self.tem_anterior and self.object_list):
+            return None
+        return codificar_cursor(self.object_list[0].chave_fila())
+
+    @property
+    def cursor_proxima(self):
+        if not (self.tem_proxima and self.object_list):
+            return None
+        return codificar_cursor(self.object_list[-1].chave_fila())
+
+
+def codificar_cursor(chave):
+    ativo, prioridade_num, data_entrada, pk = chave
+    texto = f"{int(ativo)}|{prioridade_num}|{data_entrada.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Chave a partir do cursor da URL; None se o cursor for inválido."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ativo, prioridade_num, data_entrada, pk = texto.split("|")
+        return (ativo == "1", int(prioridade_num), datetime.fromisoformat(data_entrada), int(pk))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar_por_cursor(queryset, params, por_pagina):
+    """
+    Pagina um queryset da fila (já filtrado) pelos parâmetros da URL:
+    `apos=<cursor>` (próxima), `antes=<cursor>` (anterior), `ultima=1`
+    ou nenhum deles (primeira página).
+    """
+    total = queryset.estimar_total()
+    apos = decodificar_cursor(params.get("apos", ""))
+    antes = decodificar_cursor(params.get("antes", ""))
+
+    if apos:
+        linhas = queryset.pagina_apos(apos, por_pagina + 1)
+        return PaginaCursor(linhas[:por_pagina], True, len(linhas) > por_pagina, total)
+    if antes:
+        linhas = queryset.pagina_antes(antes, por_pagina + 1)
+        return PaginaCursor(linhas[-por_pagina:], len(linhas) > por_pagina, True, total)
+    if params.get("ultima"):
+        linhas = list(queryset.reverse()[:por_pagina + 1])[::-1]
+        return PaginaCursor(linhas[-por_pagina:], len(linhas) > por_pagina, False, total)
+
+    linhas = list(queryset[:por_pagina + 1])
+    return PaginaCursor(linhas[:por_pagina], False, len(linhas) > por_pagina, total)
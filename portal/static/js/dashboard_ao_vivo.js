@@ -0,0 +1,63 @@
+// Atualiza os cartões de KPI do dashboard em tempo real (server-sent events).
+// Se o navegador não tiver EventSource ou o servidor recusar o fluxo (503 sob
+// WSGI ou com o limite de conexões atingido), consulta os KPIs em JSON a cada
+// INTERVALO_CONSULTA milissegundos.
+(function () {
+    var INTERVALO_CONSULTA = 30000;
+
+    var script = document.currentScript;
+    var url = script && script.dataset.url;
+    var urlKpis = script && script.dataset.urlKpis;
+    var ultimos = null;
+
+    function atualizar(kpis, variacao) {
+        Object.keys(kpis || {}).forEach(function (chave) {
+            var diferenca = (variacao || {})[chave];
+            document.querySelectorAll('[data-kpi="' + chave + '"]').forEach(function (el) {
+                el.textContent = kpis[chave];
+                if (diferenca) {
+                    el.title = (diferenca > 0 ? '+' : '') + diferenca + ' na última atualização';
+                }
+            });
+        });
+        ultimos = kpis;
+    }
+
+    function consultarPeriodicamente() {
+        if (!urlKpis) return;
+        setInterval(function () {
+            fetch(urlKpis, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+                .then(function (resposta) { return resposta.ok ? resposta.json() : null; })
+                .then(function (kpis) {
+                    if (!kpis) return;
+                    var variacao = {};
+                    Object.keys(kpis).forEach(function (chave) {
+                        if (ultimos && ultimos[chave] !== undefined && ultimos[chave] !== kpis[chave]) {
+                            variacao[chave] = kpis[chave] - ultimos[chave];
+                        }
+                    });
+                    atualizar(kpis, variacao);
+                })
+                .catch(function () { /* tenta de novo no próximo intervalo */ });
+        }, INTERVALO_CONSULTA);
+    }
+
+    if (!url || !window.EventSource) {
+        consultarPeriodicamente();
+        return;
+    }
+
+    var fonte = new EventSource(url);
+    fonte.addEventListener('kpis', function (e) {
+        var dados;
+        try { dados = JSON.parse(e.data); } catch (erro) { return; }
+        atualizar(dados.kpis, dados.variacao);
+    });
+    fonte.addEventListener('error', function () {
+        // Queda de conexão o navegador reconecta sozinho (readyState
+        // CONNECTING); uma resposta de erro, como o 503, fecha o fluxo
+        if (fonte.readyState === EventSource.CLOSED) {
+            consultarPeriodicamente();
+        }
+    });
+})();
@@ -7,32 +7,34 @@
     document.head.appendChild(s);
 })(initDashboardCharts);
 
-// 2) Utilitário seguro p/ ler <script type="application/json" id="...">
-function getJSON(id, fallback) {
+// 2) Busca a série do gráfico no endpoint indicado em data-url do <canvas>.
+//    O servidor responde com ETag; o navegador revalida e recebe 304 se nada mudou.
+function carregarGrafico(id) {
+    var vazio = { labels: [], data: [], percentages: [] };
     var el = document.getElementById(id);
-    if (!el) return fallback;
-    try {
-        var txt = (el.textContent || "").trim();
-        if (!txt) return fallback;
-        var parsed = JSON.parse(txt);
-        return (parsed === null ? fallback : parsed);
-    } catch (e) { return fallback; }
+    if (!el || !el.dataset.url) return Promise.resolve(vazio);
+    return fetch(el.dataset.url, { credentials: 'same-origin' })
+        .then(function (r) { return r.ok ? r.json() : vazio; })
+        .catch(function () { return vazio; });
 }
 
 function initDashboardCharts() {
+    Promise.all(['pieChart', 'barChart', 'procCountChart', 'procWaitChart', 'espWaitChart'].map(carregarGrafico))
+        .then(function (series) { desenharGraficos.apply(null, series); });
+}
+
+function desenharGraficos(pizza, mensal, porQuantidade, esperaProcedimentos, esperaEspecialidades) {
     const COLORS = (window.indicadoresColors && window.indicadoresColors.length)
         ? window.indicadoresColors
         : ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6", "#06B6D4", "#84CC16", "#F472B6", "#F97316", "#22C55E"];
 
-    const labels = getJSON('labels_json', []);
-    const data = getJSON('data_json', []);
-    const percentages = getJSON('percentages_json', []);
-    const labelsBar = getJSON('labels_bar_json', []);
-    const dataBar = getJSON('data_bar_json', []);
-    const labelsProcCnt = getJSON('labels_proc_count_json', []);
-    const dataProcCnt = getJSON('data_proc_count_json', []);
-    const labelsProcWait = getJSON('labels_proc_wait_json', []);
-    const dataProcWait = getJSON('data_proc_wait_json', []);
+    const labels = pizza.labels;
+    const data = pizza.data;
+    const percentages = pizza.percentages || [];
+    const labelsBar = mensal.labels;
+    const dataBar = mensal.data;
+    const labelsProcCnt = porQuantidade.labels;
+    const dataProcCnt = porQuantidade.data;
 
     const commonOptions = {
         responsive: true, maintainAspectRatio: false,
@@ -168,14 +170,19 @@ function initDashboardCharts() {
         });
     }
 
-    // Top-10 por espera (ativos)
-    if (labelsProcWait.length && dataProcWait.length) {
-        const el = document.getElementById('procWaitChart');
-        if (el) new Chart(el, {
+    // Tempo de espera p50/p90/p99 (ativos), top-10 pelo p90
+    function graficoEspera(id, serie) {
+        const el = document.getElementById(id);
+        if (!el || !serie.labels.length) return;
+        new Chart(el, {
             type: 'bar',
             data: {
-                labels: labelsProcWait,
-                datasets: [{ label: 'Dias de espera (ativos)', data: dataProcWait, backgroundColor: '#F59E0B', borderRadius: 6 }]
+                labels: serie.labels,
+                datasets: [
+                    { label: 'p50 (dias)', data: serie.p50, backgroundColor: '#FCD34D', borderRadius: 6 },
+                    { label: 'p90 (dias)', data: serie.p90, backgroundColor: '#F59E0B', borderRadius: 6 },
+                    { label: 'p99 (dias)', data: serie.p99, backgroundColor: '#B45309', borderRadius: 6 }
+                ]
             },
             options: {
                 ...commonOptions,
@@ -187,4 +194,6 @@ function initDashboardCharts() {
             }
         });
     }
+    graficoEspera('procWaitChart', esperaProcedimentos);
+    graficoEspera('espWaitChart', esperaEspecialidades);
 }
\ No newline at end of file
@@ -1,3 +1,190 @@
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from fila_cirurgica.models import EspecialidadeAghu, ListaEsperaCirurgica, PacienteAghu, ProcedimentoAghu
+
+from .exportacao import LINHAS_POR_ENVIO, linhas_csv, linhas_xlsx
+from .pagination import codificar_cursor, paginar_por_cursor
+
+_PLANILHA = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def ler_xlsx(conteudo):
+    """Linhas da aba da planilha, com cada célula como texto (ou None se vazia)."""
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as pacote:
+        folha = ElementTree.fromstring(pacote.read("xl/worksheets/sheet1.xml"))
+    linhas = []
+    for linha in folha.iter(f"{_PLANILHA}row"):
+        celulas = []
+        for celula in linha:
+            texto = celula.find(f"{_PLANILHA}is/{_PLANILHA}t")
+            valor = celula.find(f"{_PLANILHA}v")
+            no = texto if texto is not None else valor
+            celulas.append(None if no is None else no.text)
+        linhas.append(celulas)
+    return linhas
+
+
+def ler_csv(conteudo):
+    return list(csv.reader(io.StringIO(conteudo.decode("utf-8-sig")), delimiter=";"))
+
+
+class FilaBaseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidade = EspecialidadeAghu.objects.create(cod_especialidade="1", nome_especialidade="Cirurgia Geral")
+        cls.procedimento = ProcedimentoAghu.objects.create(codigo="0407", nome="Colecistectomia")
+        cls.usuario = User.objects.create_superuser("admin", "admin@example.com", "senha")
+
+    @classmethod
+    def criar_entrada(cls, prontuario, nome=None, **campos):
+        return ListaEsperaCirurgica.objects.create(
+            paciente=PacienteAghu.objects.create(prontuario=prontuario, nome=nome or f"Paciente {prontuario}"),
+            especialidade=cls.especialidade,
+            procedimento=cls.procedimento,
+            **campos,
+        )
+
+
+class PaginacaoCursorTests(FilaBaseTestCase):
+    POR_PAGINA = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        prioridades = ["SEM", "ONC", "SEM", "BRE", "ONC", "SEM", "SEM", "ONC"] * 3
+        for i, prioridade in enumerate(prioridades):
+            cls.criar_entrada(str(i), prioridade=prioridade, ativo=i % 3 != 2)
+        # Empates em prioridade_num e data_entrada: só o id desempata
+        ListaEsperaCirurgica.objects.update(data_entrada=now())
+        cls.ordem = list(ListaEsperaCirurgica.objects.ordered().values_list("pk", flat=True))
+
+    def paginar(self, **params):
+        pagina = paginar_por_cursor(ListaEsperaCirurgica.objects.ordered(), params, self.POR_PAGINA)
+        return pagina, [obj.pk for obj in pagina]
+
+    def test_percorre_a_fila_para_frente_e_para_tras(self):
+        ativos = ListaEsperaCirurgica.objects.filter(ativo=True).count()
+        # A fronteira entre ativos e inativos cai no meio de uma página
+        self.assertNotEqual(ativos % self.POR_PAGINA, 0)
+
+        pagina, ids = self.paginar()
+        self.assertFalse(pagina.tem_anterior)
+        paginas = [ids]
+        while pagina.tem_proxima:
+            pagina, ids = self.paginar(apos=pagina.cursor_proxima)
+            paginas.append(ids)
+        self.assertEqual(sum(paginas, []), self.ordem)
+        self.assertEqual(pagina.total_estimado, len(self.ordem))
+
+        de_tras = [ids]
+        while pagina.tem_anterior:
+            pagina, ids = self.paginar(antes=pagina.cursor_anterior)
+            de_tras.append(ids)
+        self.assertEqual(sum(reversed(de_tras), []), self.ordem)
+        self.assertEqual(de_tras[-1], self.ordem[:self.POR_PAGINA])
+
+    def test_ultima_pagina(self):
+        pagina, ids = self.paginar(ultima="1")
+        self.assertEqual(ids, self.ordem[-self.POR_PAGINA:])
+        self.assertTrue(pagina.tem_anterior)
+        self.assertFalse(pagina.tem_proxima)
+
+    def test_cursor_invalido_volta_a_primeira_pagina(self):
+        adulterado = codificar_cursor(ListaEsperaCirurgica.objects.first().chave_fila())[:-4] + "%%%%"
+        for cursor in ("", "!!!", "bGl4bw", "MXx4fHl8eg", adulterado):
+            with self.subTest(cursor=cursor):
+                pagina, ids = self.paginar(apos=cursor, antes=cursor)
+                self.assertEqual(ids, self.ordem[:self.POR_PAGINA])
+                self.assertFalse(pagina.tem_anterior)
+
+    def test_lista_pagina_por_cursor(self):
+        self.client.force_login(self.usuario)
+        url = reverse("portal:fila_list")
+        resposta = self.client.get(url)
+        primeira = resposta.context["page_obj"]
+        self.assertEqual([obj.pk for obj in primeira], self.ordem[:10])
+
+        resposta = self.client.get(url, {"apos": codificar_cursor(primeira.object_list[4].chave_fila())})
+        self.assertEqual([obj.pk for obj in resposta.context["objetos"]], self.ordem[5:15])
+
+        resposta = self.client.get(url, {"apos": "cursor-adulterado"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([obj.pk for obj in resposta.context["objetos"]], self.ordem[:10])
+
+
+class ExportacaoTests(TestCase):
+    def test_xlsx_escapa_texto_e_remove_caracteres_de_controle(self):
+        conteudo = b"".join(linhas_xlsx(("Nome", "Total", "Vazio"), [("<Ana> & \x01Bia\x1f", 3, None)]))
+        self.assertEqual(ler_xlsx(conteudo), [["Nome", "Total", "Vazio"], ["<Ana> & Bia", "3", None]])
+
+    def test_xlsx_enviado_aos_pedacos(self):
+        linhas = [(f"linha {i}", i) for i in range(LINHAS_POR_ENVIO * 2)]
+        partes = list(linhas_xlsx(("Nome", "Número"), linhas))
+        self.assertGreater(len(partes), 2)
+        lidas = ler_xlsx(b"".join(partes))
+        self.assertEqual(len(lidas), len(linhas) + 1)
+        self.assertEqual(lidas[-1], [f"linha {len(linhas) - 1}", str(len(linhas) - 1)])
+
+    def test_csv_com_bom_e_ponto_e_virgula(self):
+        conteudo = "".join(linhas_csv(("Nome", "Obs"), [("Ana; Bia", 'diz "oi"')])).encode()
+        self.assertTrue(conteudo.startswith("\ufeff".encode()))
+        self.assertEqual(ler_csv(conteudo), [["Nome", "Obs"], ["Ana; Bia", 'diz "oi"']])
+
+
+class ExportViewsTests(FilaBaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for prontuario, nome, prioridade in (
+            ("10", "<Ana> & \x02Bia", "ONC"),
+            ("11", "Carlos", "SEM"),
+            ("12", "Dora", "ONC"),
+        ):
+            cls.criar_entrada(prontuario, nome, prioridade=prioridade)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def exportar(self, rota, **params):
+        resposta = self.client.get(reverse(rota), params)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        return resposta, b"".join(resposta.streaming_content)
+
+    def test_fila_xlsx_aplica_os_filtros_da_lista(self):
+        resposta, conteudo = self.exportar("portal:fila_export", formato="xlsx", prioridade="ONC")
+        self.assertIn("fila_", resposta["Content-Disposition"])
+        self.assertTrue(resposta["Content-Disposition"].endswith('.xlsx"'))
+        cabecalho, *linhas = ler_xlsx(conteudo)
+        self.assertEqual(cabecalho[:3], ["Posição", "Prontuário", "Paciente"])
+        self.assertEqual([linha[1:3] for linha in linhas], [["10", "<Ana> & Bia"], ["12", "Dora"]])
+        self.assertEqual({linha[cabecalho.index("Ativo")] for linha in linhas}, {"Sim"})
+
+    def test_fila_csv_aplica_os_filtros_da_lista(self):
+        resposta, conteudo = self.exportar("portal:fila_export", formato="csv", prioridade="SEM")
+        self.assertTrue(resposta["Content-Type"].startswith("text/csv"))
+        cabecalho, *linhas = ler_csv(conteudo)
+        self.assertEqual(len(cabecalho), len(linhas[0]))
+        self.assertEqual([linha[1:3] for linha in linhas], [["11", "Carlos"]])
+
+    def test_formato_desconhecido_exporta_csv(self):
+        resposta, _ = self.exportar("portal:fila_export", formato="pdf")
+        self.assertTrue(resposta["Content-Disposition"].endswith('.csv"'))
+
+    def test_dashboard_exporta_os_indicadores(self):
+        _, conteudo = self.exportar("portal:dashboard_export", formato="xlsx")
+        cabecalho, *linhas = ler_xlsx(conteudo)
+        self.assertEqual(cabecalho, ["Indicador", "Item", "Valor"])
+        self.assertIn(["Resumo", "Pacientes na fila", "3"], linhas)
+        self.assertIn(["Resumo", "Oncológicos", "2"], linhas)
 
-# Create your tests here.
+        _, conteudo = self.exportar("portal:dashboard_export", formato="csv")
+        self.assertIn(["Resumo", "Pacientes na fila", "3"], ler_csv(conteudo))
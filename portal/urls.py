@@ -3,8 +3,11 @@ from django.contrib.auth import views as auth_views
 
 from .views import (
     AihDetailView,
+    DashboardExportView,
+    DashboardKpisView,
     DashboardView,
     FilaDeactivateView,
+    FilaExportView,
     FilaListView,
     FilaCreateView,
     FilaDetailView,
@@ -12,7 +15,8 @@ from .views import (
     FilaHistoryView,
     AihListView,
     AihCreateView,
-    PortalLoginView
+    PortalLoginView,
+    eventos_dashboard,
 )
 
 app_name = "portal"
@@ -24,9 +28,13 @@ urlpatterns = [
 
     # Dashboard
     path("", DashboardView.as_view(), name="dashboard"),
+    path("exportar/", DashboardExportView.as_view(), name="dashboard_export"),
+    path("eventos/", eventos_dashboard, name="dashboard_eventos"),
+    path("kpis/", DashboardKpisView.as_view(), name="dashboard_kpis"),
 
     # Fila (ListaEsperaCirurgica)
     path("fila/", FilaListView.as_view(), name="fila_list"),
+    path("fila/exportar/", FilaExportView.as_view(), name="fila_export"),
     path("fila/nova/", FilaCreateView.as_view(), name="fila_create"),
     path("fila/<int:pk>/", FilaDetailView.as_view(), name="fila_detail"),
     path("fila/<int:pk>/editar/", FilaUpdateView.as_view(), name="fila_update"),
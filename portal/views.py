@@ -1,23 +1,39 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import asyncio
+import json
 from typing import Any, Dict
 
+from asgiref.sync import sync_to_async
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
-from django.db.models import Count, Min
-from django.db.models.functions import TruncMonth
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
-from django.utils.timezone import now, localtime
+from django.utils.timezone import now, localdate, localtime
 from django.views.decorators.http import require_GET
-from django.views.generic import CreateView, DetailView, TemplateView, UpdateView, FormView
+from django.views.generic import CreateView, DetailView, TemplateView, UpdateView, FormView, View
 from django_filters.views import FilterView
 from simple_history.utils import update_change_reason
 
-from fila_cirurgica.models import EspecialidadeAghu, ListaEsperaCirurgica, PacienteAghu, ProcedimentoAghu, ProfissionalAghu
+from fila_cirurgica.models import (
+    PARTICOES_FILA,
+    EspecialidadeAghu,
+    ListaEsperaCirurgica,
+    PacienteAghu,
+    PrevisaoCirurgia,
+    ProcedimentoAghu,
+    ProfissionalAghu,
+    SnapshotFila,
+)
+from fila_cirurgica.cache import indicadores_em_cache
+from fila_cirurgica.eventos import barramento, variacao_kpis, vigiar_versao
+from fila_cirurgica.indicadores import kpis_fila, periodo_meses
 from .filters import FilaFilter
+from .exportacao import resposta_exportacao
+from .pagination import paginar_por_cursor
 from .forms import FilaCreateForm, FilaUpdateForm, FilaDeactivateForm
 from django.shortcuts import render
 
@@ -85,75 +101,126 @@ class DashboardView(StaffRequiredMixin, PermissionRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        # KPIs e gráficos (ver fila_cirurgica.indicadores)
+        ctx.update(indicadores_em_cache(periodo_meses(self.request.GET.get("meses"))))
+        ctx["agora"] = now()
+        return ctx
 
-        hoje = now().date()
-        inicio_periodo = hoje.replace(day=1) - timedelta(days=60)
-
-        ativos = ListaEsperaCirurgica.objects.filter(ativo=True)
-
-        # KPIs (apenas ativos)
-        ctx["pacientes_na_fila"] = ativos.values(
-            "paciente_id").distinct().count()
-        ctx["especialidades_na_fila"] = ativos.values(
-            "especialidade_id").distinct().count()
-        ctx["procedimentos_na_fila"] = ativos.values(
-            "procedimento_id").distinct().count()
-        ctx["count_eletivos"] = ativos.filter(
-            prioridade="SEM", medida_judicial=False).count()
-        ctx["count_oncologicos"] = ativos.filter(prioridade="ONC").count()
-        ctx["count_judicializados"] = ativos.filter(
-            medida_judicial=True).count()
-
-        # Pizza — distribuição por especialidade (apenas ativos)
-        dist_qs = (
-            ativos.values("especialidade__nome_especialidade")
-            .annotate(total=Count("id"))
-            .order_by("especialidade__nome_especialidade")
-        )
-        labels = [row["especialidade__nome_especialidade"]
-                  or "—" for row in dist_qs]
-        data = [row["total"] for row in dist_qs]
-        total_geral = sum(data) or 1
-        ctx["labels"] = labels
-        ctx["data"] = data
-        ctx["percentages"] = [round((v / total_geral) * 100, 2) for v in data]
-
-        # Barras — entradas criadas no período (todas as entradas)
-        mensal_qs = (
-            ListaEsperaCirurgica.objects.filter(
-                data_entrada__date__gte=inicio_periodo)
-            .annotate(mes=TruncMonth("data_entrada"))
-            .values("mes")
-            .annotate(total=Count("id"))
-            .order_by("mes")
+
+# Comentário enviado quando não há eventos, para manter a conexão aberta
+# em proxies e perceber clientes que já saíram.
+SSE_HEARTBEAT = 15
+
+
+async def eventos_dashboard(request):
+    """
+    Server-sent events do dashboard: envia os KPIs atuais ao conectar e, a
+    cada alteração da fila, os novos valores e a variação (ver
+    fila_cirurgica.eventos). Só funciona sob ASGI; sob WSGI (runserver), ou
+    acima de SSE_MAX_CONEXOES, responde 503 e a página passa a consultar
+    `DashboardKpisView` periodicamente.
+    """
+    user = await request.auser()
+    if not user.is_authenticated or not user.is_active:
+        return HttpResponse(status=403)
+    if not await sync_to_async(user.has_perm)("fila_cirurgica.view_listaesperacirurgica"):
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Atualização ao vivo requer ASGI.", status=503)
+    if barramento.lotado():
+        response = HttpResponse("Limite de conexões ao vivo atingido.", status=503)
+        response["Retry-After"] = "60"
+        return response
+
+    response = StreamingHttpResponse(_fluxo_eventos(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: não acumular a resposta
+    return response
+
+
+async def _fluxo_eventos():
+    # A assinatura fica dentro do gerador: se o cliente sair antes de o
+    # fluxo começar, o gerador nem roda e não sobra fila no barramento.
+    fila = barramento.assinar()
+    if fila is None:
+        # Lotou entre a verificação e o início do fluxo: o navegador tenta
+        # de novo em um minuto
+        yield "retry: 60000\n\n"
+        return
+    try:
+        vigiar_versao()
+        # Base das variações desta conexão; as demais têm a sua
+        kpis = await sync_to_async(kpis_fila)()
+        yield _evento_sse({"kpis": kpis, "variacao": {}})
+        while True:
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            variacao = variacao_kpis(kpis, evento["kpis"])
+            if variacao:
+                kpis = evento["kpis"]
+                yield _evento_sse({"kpis": kpis, "variacao": variacao})
+    finally:
+        # Cliente desconectou (o Django cancela o gerador) ou o servidor parou
+        barramento.cancelar(fila)
+
+
+def _evento_sse(dados):
+    return f"event: kpis\ndata: {json.dumps(dados)}\n\n"
+
+
+class DashboardKpisView(StaffRequiredMixin, PermissionRequiredMixin, View):
+    """
+    KPIs atuais em JSON: consultados periodicamente pelo dashboard quando o
+    fluxo de eventos não está disponível.
+    """
+    permission_required = "fila_cirurgica.view_listaesperacirurgica"
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(kpis_fila())
+
+
+class DashboardExportView(StaffRequiredMixin, PermissionRequiredMixin, View):
+    """Indicadores do dashboard (mesmos números, mesmo período) em CSV/XLSX."""
+    permission_required = "fila_cirurgica.view_listaesperacirurgica"
+
+    def get(self, request, *args, **kwargs):
+        meses = periodo_meses(request.GET.get("meses"))
+        linhas = _linhas_indicadores(indicadores_em_cache(meses))
+        return resposta_exportacao(
+            f"indicadores_{localdate():%Y%m%d}",
+            request.GET.get("formato"),
+            ("Indicador", "Item", "Valor"),
+            linhas,
         )
-        ctx["labels_bar"] = [row["mes"].strftime("%b/%Y") for row in mensal_qs]
-        ctx["data_bar"] = [row["total"] for row in mensal_qs]
-
-        # Top 10 procedimentos com mais pacientes (apenas ativos)
-        proc_count_qs = ativos.values("procedimento__nome").annotate(
-            total=Count("id")).order_by("-total")[:10]
-        ctx["labels_proc_count"] = [
-            row["procedimento__nome"] or "—" for row in proc_count_qs]
-        ctx["data_proc_count"] = [row["total"] for row in proc_count_qs]
-
-        # Top 10 maior tempo de espera (dias) por procedimento (apenas ativos)
-        first_dt_qs = ativos.values("procedimento__nome").annotate(
-            first_dt=Min("data_entrada"))
-        hoje_dt = now()
-        wait_pairs = [
-            (row["procedimento__nome"] or "—",
-             (hoje_dt - row["first_dt"]).days)
-            for row in first_dt_qs
-            if row["first_dt"] is not None
-        ]
-        wait_pairs.sort(key=lambda x: x[1], reverse=True)
-        wait_pairs = wait_pairs[:10]
-        ctx["labels_proc_wait"] = [name for name, _ in wait_pairs]
-        ctx["data_proc_wait"] = [days for _, days in wait_pairs]
 
-        ctx["agora"] = now()
-        return ctx
+
+def _linhas_indicadores(dados):
+    """(indicador, item, valor) a partir do resultado de `indicadores_fila`."""
+    kpis = (
+        ("Pacientes na fila", "pacientes_na_fila"),
+        ("Especialidades na fila", "especialidades_na_fila"),
+        ("Procedimentos na fila", "procedimentos_na_fila"),
+        ("Eletivos", "count_eletivos"),
+        ("Oncológicos", "count_oncologicos"),
+        ("Judicializados", "count_judicializados"),
+    )
+    for rotulo, chave in kpis:
+        yield ("Resumo", rotulo, dados[chave])
+    for item, total, pct in zip(dados["labels"], dados["data"], dados["percentages"]):
+        yield ("Pacientes por especialidade", item, total)
+        yield ("Pacientes por especialidade (%)", item, pct)
+    for item, total in zip(dados["labels_bar"], dados["data_bar"]):
+        yield ("Entradas por mês", item, total)
+    for item, total in zip(dados["labels_proc_count"], dados["data_proc_count"]):
+        yield ("Top procedimentos por pacientes", item, total)
+    for titulo, chave in (("procedimento", "espera_procedimentos"), ("especialidade", "espera_especialidades")):
+        espera = dados[chave]
+        for i, item in enumerate(espera["labels"]):
+            for percentil in ("p50", "p90", "p99"):
+                yield (f"Espera por {titulo} — {percentil} (dias)", item, espera[percentil][i])
 
 
 # --------------------- Lista / Filtros ---------------------
@@ -163,6 +230,9 @@ class FilaListView(StaffRequiredMixin, PermissionRequiredMixin, FilterView):
     model = ListaEsperaCirurgica
     filterset_class = FilaFilter
     paginate_by = 10
+    # Paginação por cursor (custo constante em qualquer página, total estimado);
+    # False volta à paginação numerada com OFFSET e COUNT(*) exato.
+    paginacao_cursor = True
     template_name = "portal/fila_list.html"
     context_object_name = "objetos"
 
@@ -174,12 +244,65 @@ class FilaListView(StaffRequiredMixin, PermissionRequiredMixin, FilterView):
         qs = (base() if callable(base) else ListaEsperaCirurgica.objects.all())
         return qs.select_related("paciente", "especialidade", "procedimento", "medico")
 
+    def paginate_queryset(self, queryset, page_size):
+        if not self.paginacao_cursor:
+            return super().paginate_queryset(queryset, page_size)
+        pagina = paginar_por_cursor(queryset, self.request.GET, page_size)
+        return (None, pagina, pagina.object_list, pagina.tem_anterior or pagina.tem_proxima)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        print(ctx.keys())
+        ctx["paginacao_cursor"] = self.paginacao_cursor
+        # Posições da página (geral e por sub-fila) em uma só consulta
+        ListaEsperaCirurgica.objects.anotar_posicoes(ctx["objetos"], *PARTICOES_FILA)
         return ctx
 
 
+PRIORIDADES = dict(ListaEsperaCirurgica.PRIORIDADE_CHOICES)
+
+
+class FilaExportView(StaffRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Fila com os mesmos filtros da lista, em CSV/XLSX. Lê só as colunas
+    exportadas (`values_list`) em lotes (`iterator`) e envia enquanto lê:
+    a memória não cresce com o tamanho da exportação.
+    """
+    permission_required = "fila_cirurgica.view_listaesperacirurgica"
+    colunas = (
+        ("Posição", "posicao"),
+        ("Prontuário", "paciente__prontuario"),
+        ("Paciente", "paciente__nome"),
+        ("Especialidade", "especialidade__nome_especialidade"),
+        ("Procedimento", "procedimento__nome"),
+        ("Médico", "medico__nome"),
+        ("Prioridade", "prioridade"),
+        ("Ativo", "ativo"),
+        ("Judicial", "medida_judicial"),
+        ("Entrada", "data_entrada"),
+    )
+
+    def get(self, request, *args, **kwargs):
+        filtro = FilaFilter(request.GET, queryset=ListaEsperaCirurgica.objects.ordered())
+        valores = filtro.qs.values_list(*(campo for _, campo in self.colunas)).iterator(chunk_size=2000)
+        return resposta_exportacao(
+            f"fila_{localdate():%Y%m%d}",
+            request.GET.get("formato"),
+            [titulo for titulo, _ in self.colunas],
+            map(self._formatar, valores),
+        )
+
+    @staticmethod
+    def _formatar(linha):
+        *inicio, prioridade, ativo, judicial, data_entrada = linha
+        return (
+            *inicio,
+            PRIORIDADES.get(prioridade, prioridade),
+            "Sim" if ativo else "Não",
+            "Sim" if judicial else "Não",
+            localtime(data_entrada).strftime("%d/%m/%Y %H:%M"),
+        )
+
+
 # --------------------- Visualizar ---------------------
 class FilaDetailView(StaffRequiredMixin, PermissionRequiredMixin, DetailView):
     permission_required = "fila_cirurgica.view_listaesperacirurgica"
@@ -197,6 +320,24 @@ class FilaDetailView(StaffRequiredMixin, PermissionRequiredMixin, DetailView):
             except Exception:
                 posicao = None
         ctx["posicao"] = posicao
+
+        # Posição dentro da especialidade / procedimento / médico
+        if obj.ativo:
+            ListaEsperaCirurgica.objects.anotar_posicoes([obj], *PARTICOES_FILA)
+        ctx["posicoes_particao"] = [
+            ("Na especialidade", getattr(obj, "posicao_especialidade", None)),
+            ("No procedimento", getattr(obj, "posicao_procedimento", None)),
+            ("Com o médico", getattr(obj, "posicao_medico", None)),
+        ]
+
+        # Evolução da posição (snapshots diários das últimas 4 semanas)
+        tendencia = SnapshotFila.tendencia([obj.pk])[obj.pk] if obj.ativo else []
+        ctx["tendencia"] = tendencia
+        ctx["variacao"] = SnapshotFila.variacao(tendencia, posicao)
+        ctx["variacao_abs"] = abs(ctx["variacao"] or 0)
+
+        # Data estimada de cirurgia (calculada em lote por prever_datas_cirurgia)
+        ctx["previsao"] = PrevisaoCirurgia.objects.filter(entrada=obj).first() if obj.ativo else None
         return ctx
 
 